@@ -1,21 +1,202 @@
 import os
 import sys
 import re
-import tkinter as tk
-from tkinter import filedialog
-from tkinter import messagebox
+import importlib
+import queue
+import threading
 import time
 from pathlib import Path
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeElapsedColumn, TimeRemainingColumn
-from rich.table import Table
-from rich.rule import Rule
-from rich.text import Text
-from rich import print
-
-console = Console()
+# rich, tkinter, sqlite3, argparse, asyncio and concurrent.futures are
+# imported where they are first needed, so that scripted runs start quickly
+# and --plain output never loads rich at all.
+
+_MARKUP_TAG = re.compile(r"(?<!\\)\[([a-z#/@][^\[\]]*?)\]")
+
+def strip_markup(text) -> str:
+    """Removes rich console markup tags, e.g. '[bold red]Error[/]' -> 'Error'."""
+    return _MARKUP_TAG.sub("", str(text)).replace("\\[", "[")
+
+class _PlainRule:
+    def __init__(self, title="", **kwargs):
+        self.title = title
+
+    def __str__(self):
+        return f"--- {strip_markup(self.title)} ---" if self.title else "-" * 40
+
+class _PlainPanel:
+    def __init__(self, renderable, title=None, **kwargs):
+        self.renderable = renderable
+        self.title = title
+
+    def __str__(self):
+        lines = [f"== {strip_markup(self.title)} =="] if self.title else []
+        lines.append(strip_markup(self.renderable))
+        return "\n".join(lines)
+
+class _PlainTable:
+    def __init__(self, title=None, show_header=True, caption=None, **kwargs):
+        self.title = title
+        self.caption = caption
+        self.show_header = show_header
+        self.headers = []
+        self.rows = []
+
+    def add_column(self, header="", **kwargs):
+        self.headers.append(strip_markup(header))
+
+    def add_row(self, *cells):
+        self.rows.append([strip_markup(cell) for cell in cells])
+
+    def __str__(self):
+        rows = ([self.headers] if self.show_header else []) + self.rows
+        widths = [max((len(row[i]) for row in rows), default=0) for i in range(len(self.headers))]
+        lines = [strip_markup(self.title)] if self.title else []
+        for n, row in enumerate(rows):
+            lines.append("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+            if n == 0 and self.show_header:
+                lines.append("  ".join("-" * width for width in widths))
+        if self.caption:
+            lines.append(strip_markup(self.caption))
+        return "\n".join(lines)
+
+class _PlainProgress:
+    """Stand-in for rich.progress.Progress that draws nothing."""
+    def __init__(self, *columns, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_task(self, description, **kwargs):
+        return 0
+
+    def update(self, task_id, **kwargs):
+        pass
+
+class _PlainLive:
+    """Stand-in for rich.live.Live that prints each new version in full."""
+    def __init__(self, renderable=None, console=None, **kwargs):
+        self.renderable = renderable
+        self.console = console
+
+    def __enter__(self):
+        self.console.print(self.renderable)
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def update(self, renderable, refresh=False):
+        self.renderable = renderable
+        self.console.print(renderable)
+
+class _PlainColumn:
+    def __init__(self, *args, **kwargs):
+        pass
+
+class _PlainConfirm:
+    @staticmethod
+    def ask(prompt, console=None, default=False):
+        answer = input(f"{strip_markup(prompt)} [y/n] ({'y' if default else 'n'}): ").strip().lower()
+        return default if not answer else answer in ("y", "yes")
+
+class PlainConsole:
+    """Minimal stand-in for rich.console.Console that prints unstyled text."""
+    def __init__(self, stderr=False):
+        self.stderr = stderr
+
+    def print(self, *objects, **kwargs):
+        print(*(strip_markup(obj) for obj in objects), file=sys.stderr if self.stderr else sys.stdout)
+
+    def print_exception(self, **kwargs):
+        import traceback
+        traceback.print_exc()
+
+_PLAIN_UI = {
+    "Console": PlainConsole, "Panel": _PlainPanel, "Confirm": _PlainConfirm,
+    "Progress": _PlainProgress, "SpinnerColumn": _PlainColumn, "TextColumn": _PlainColumn,
+    "TimeElapsedColumn": _PlainColumn,
+    "Table": _PlainTable, "Rule": _PlainRule, "Text": lambda text, **kwargs: text, "Live": _PlainLive,
+}
+
+_RICH_UI = {
+    "Console": "rich.console", "Panel": "rich.panel", "Confirm": "rich.prompt",
+    "Progress": "rich.progress", "SpinnerColumn": "rich.progress", "TextColumn": "rich.progress",
+    "TimeElapsedColumn": "rich.progress",
+    "Table": "rich.table", "Rule": "rich.rule", "Text": "rich.text", "Live": "rich.live",
+}
+
+class _UserInterface:
+    """Hands out the rich classes (ui.Table, ui.Rule, ...), importing each on
+       first use. In plain mode, or when rich is not installed, the plain-text
+       stand-ins above are returned instead and rich is never imported.
+    """
+    def __init__(self):
+        self.plain = False
+        self.stderr = False
+        self._console = None
+
+    def __getattr__(self, name):
+        if name not in _RICH_UI:
+            raise AttributeError(name)
+        if not self.plain:
+            try:
+                value = getattr(importlib.import_module(_RICH_UI[name]), name)
+            except ImportError:
+                self.plain = True
+        if self.plain:
+            value = _PLAIN_UI[name]
+        setattr(self, name, value)
+        return value
+
+    def get_console(self):
+        if self._console is None:
+            self._console = self.Console(stderr=self.stderr)
+        return self._console
+
+class _ConsoleProxy:
+    """Module-level console that creates the real one on first use."""
+    def __getattr__(self, name):
+        return getattr(ui.get_console(), name)
+
+ui = _UserInterface()
+console = _ConsoleProxy()
+
+# On local disks listings come from the kernel's caches and the serial walk
+# beats a thread pool (see bench_dirsizer.py suite), so the pool is opt-in.
+DEFAULT_SCAN_WORKERS = 1
+# Pool size suggested for --workers on network file systems (NFS/SMB),
+# where each listing waits on a round trip.
+NETWORK_SCAN_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+DEFAULT_CACHE_MAX_ENTRIES = 2_000_000
+# Listings kept in flight by the asyncio walker (--async), overall and per
+# mount point. Network shares answer many requests at once, so these are
+# well above the thread count that suits local disks.
+DEFAULT_MAX_IN_FLIGHT = 64
+DEFAULT_MAX_PER_MOUNT = 16
+
+# How file sizes are counted: "apparent" sums st_size (the logical length),
+# "allocated" sums st_blocks * 512 (space actually used, so sparse files count
+# for less) and "unique" is allocated size with every hard-linked inode
+# counted once, like du.
+ACCOUNTING_MODES = ("apparent", "allocated", "unique")
+
+scan_settings = {
+    "workers": DEFAULT_SCAN_WORKERS,
+    "cache": None,
+    "accounting": "apparent",
+    "top": 0,
+    "backend": "auto",
+    "filter": None,
+    "async": False,
+    "max_in_flight": DEFAULT_MAX_IN_FLIGHT,
+    "max_per_mount": DEFAULT_MAX_PER_MOUNT,
+    "timeout": None,
+}
 
 def format_size(size_bytes):
     """Converts a size in bytes to a human-readable format (KB, MB, GB, etc.)."""
@@ -37,36 +218,1511 @@ def check_if_already_renamed(folder_name):
     pattern = r"\s+\[\d+(\.\d+)?\s+(B|K[Bb]|M[Bb]|G[Bb]|T[Bb]|P[Bb]|E[Bb]|Z[Bb]|Y[Bb])\]$"
     return re.search(pattern, folder_name) is not None
 
-def get_folder_size(folder_path: Path):
-    """Calculates the total size of a folder including all its subfolders and files.
-       Uses pathlib.Path. Returns (total_size, items_skipped).
+class InodeSet:
+    """Set of (st_dev, st_ino) pairs used to count hard-linked files once.
+
+       Each device gets an open-addressing hash table packed into an
+       array('Q') of inode numbers, which costs roughly 8-16 bytes per inode
+       instead of the ~150 bytes of a Python set of tuples, so it scales to
+       tens of millions of files. Safe to share between scan threads.
     """
-    total_size = 0
-    items_skipped = 0
-    try:
-        for entry in os.scandir(folder_path):
-            entry_path = Path(entry.path)
+
+    _EMPTY = 0
+    _MAX_LOAD = 0.7
+    _MULTIPLIER = 0x9E3779B97F4A7C15  # 2**64 / golden ratio
+    _MASK64 = (1 << 64) - 1
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, dev: int, ino: int) -> bool:
+        """Adds the inode; returns False if it had already been seen."""
+        key = ino + 1  # 0 marks an empty slot
+        if key > self._MASK64:
+            raise ValueError(f"inode number out of range: {ino}")
+        with self._lock:
+            entry = self._tables.get(dev)
+            if entry is None:
+                entry = self._tables[dev] = [self._new_table(1024), 0]
+            table, used = entry
+            if (used + 1) > len(table) * self._MAX_LOAD:
+                table = entry[0] = self._grow(table)
+            if not self._insert(table, key):
+                return False
+            entry[1] = used + 1
+            self._count += 1
+            return True
+
+    @staticmethod
+    def _new_table(capacity: int):
+        from array import array
+        return array("Q", bytes(8 * capacity))
+
+    def _insert(self, table, key: int) -> bool:
+        mask = len(table) - 1
+        slot = ((key * self._MULTIPLIER) & self._MASK64) >> (64 - mask.bit_length())
+        while True:
+            current = table[slot]
+            if current == key:
+                return False
+            if current == self._EMPTY:
+                table[slot] = key
+                return True
+            slot = (slot + 1) & mask
+
+    def _grow(self, table):
+        bigger = self._new_table(len(table) * 2)
+        for key in table:
+            if key != self._EMPTY:
+                self._insert(bigger, key)
+        return bigger
+
+class TopEntries:
+    """Keeps the N largest files and N largest directories met during a
+       scan in bounded min-heaps, so memory stays O(N) however large the
+       tree is. Directory sizes are whole-subtree totals at any depth.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.files = []
+        self.dirs = []
+        # Files no larger than this cannot enter the heap; checked without
+        # the lock so the common case costs one comparison.
+        self.file_threshold = -1
+        self._lock = threading.Lock()
+
+    def offer_file(self, size: int, path: str):
+        with self._lock:
+            self._push(self.files, size, path)
+            if len(self.files) == self.n:
+                self.file_threshold = self.files[0][0]
+
+    def offer_dir(self, size: int, path: str):
+        with self._lock:
+            self._push(self.dirs, size, path)
+
+    def _push(self, heap, size, path):
+        import heapq
+
+        if len(heap) < self.n:
+            heapq.heappush(heap, (size, path))
+        elif size > heap[0][0]:
+            heapq.heapreplace(heap, (size, path))
+
+    def largest_files(self, under: str | None = None) -> list[tuple[int, str]]:
+        """Largest files first, optionally only those below the path under."""
+        return self._sorted(self.files, under)
+
+    def largest_dirs(self, under: str | None = None) -> list[tuple[int, str]]:
+        return self._sorted(self.dirs, under)
+
+    @staticmethod
+    def _sorted(heap, under):
+        if under is not None:
+            prefix = os.path.join(under, "")
+            heap = [item for item in heap if item[1].startswith(prefix)]
+        return sorted(heap, reverse=True)
+
+class ScanStats:
+    """Counters for one scan, for the live progress display and the
+       end-of-run summary. Listing threads add their per-directory counts
+       once per directory; everything else is updated by the thread that
+       drives the walk. If on_progress is set it is called with the stats
+       at most every progress_interval seconds while the walk runs.
+    """
+
+    def __init__(self, on_progress=None, progress_interval: float = 0.2):
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.directories = 0
+        self.entries = 0
+        self.bytes = 0
+        self.items_skipped = 0
+        self.errors = 0
+        self.listing_calls = 0
+        self.stat_calls = 0
+        self.cache_hits = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        self._next_report = self.started + progress_interval
+        self._lock = threading.Lock()
+
+    def add_listing(self, entries: int, listing_calls: int, stat_calls: int, cache_hit: bool = False):
+        with self._lock:
+            self.entries += entries
+            self.listing_calls += listing_calls
+            self.stat_calls += stat_calls
+            self.cache_hits += cache_hit
+
+    def add_directory(self, file_bytes: int, items_skipped: int, error):
+        self.directories += 1
+        self.bytes += file_bytes
+        self.items_skipped += items_skipped
+        self.errors += error is not None
+        if self.on_progress is not None:
+            now = time.perf_counter()
+            if now >= self._next_report:
+                self._next_report = now + self.progress_interval
+                self.on_progress(self)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def syscalls(self) -> int:
+        """Filesystem calls issued: one per directory listing and per stat."""
+        return self.listing_calls + self.stat_calls
+
+    def rate(self, count: int) -> float:
+        return count / self.elapsed if self.elapsed > 0 else 0.0
+
+    def describe(self) -> str:
+        """One-line live counter text."""
+        return (f"{self.entries:,} entries · {format_size(self.bytes)} · "
+                f"{self.rate(self.directories):,.0f} dirs/s")
+
+    def summary(self) -> str:
+        text = (f"Scanned {self.directories:,} directories and {self.entries:,} entries "
+                f"({format_size(self.bytes)}) in {self.elapsed:.2f} s: "
+                f"{self.rate(self.entries):,.0f} entries/s, {self.rate(self.directories):,.0f} dirs/s, "
+                f"{format_size(self.rate(self.bytes))}/s. "
+                f"{self.syscalls:,} filesystem calls ({self.listing_calls:,} listings, {self.stat_calls:,} stats)")
+        if self.cache_hits:
+            text += f", {self.cache_hits:,} directories from cache"
+        return text + f", {self.errors:,} error(s)."
+
+class ScanFilter:
+    """Include/exclude rules and file-system boundary pruning for a scan,
+       compiled once into a few regular expressions so that checking an
+       entry costs one or two regex matches.
+
+       Exclude rules apply to files and directories: an excluded directory
+       is never listed, so nothing below it is read. Include rules apply
+       to files only; when there are any, only matching files are counted,
+       while directories are still descended into. Globs without a "/"
+       match entry names (".git", "*.tmp"); globs with a "/" and regular
+       expressions match the path relative to the scanned folder, with "/"
+       separators. With one_file_system, directories on a different device
+       than the scanned folder are skipped, like du -x.
+    """
+
+    def __init__(self, exclude=(), exclude_regex=(), include=(), include_regex=(), one_file_system=False):
+        self.rules = (tuple(exclude), tuple(exclude_regex), tuple(include), tuple(include_regex))
+        self.one_file_system = one_file_system
+        self._exclude_name, self._exclude_path = self._compile(exclude, exclude_regex)
+        self._include_name, self._include_path = self._compile(include, include_regex)
+        self._has_includes = bool(include or include_regex)
+        self._root_prefix = None
+        self._root_dev = None
+
+    @staticmethod
+    def _compile(globs, regexes):
+        """Returns (name_pattern, path_pattern), either None when unused.
+           Raises re.error for an invalid expression.
+        """
+        import fnmatch
+
+        flags = re.IGNORECASE if os.name == "nt" else 0
+        name_globs = [fnmatch.translate(glob) for glob in globs if "/" not in glob]
+        path_parts = [fnmatch.translate(glob.lstrip("/")) for glob in globs if "/" in glob]
+        # fnmatch patterns are anchored at both ends; let regexes match anywhere.
+        path_parts += [f".*?(?:{regex})" for regex in regexes]
+        name_pattern = re.compile("|".join(f"(?:{part})" for part in name_globs), flags) if name_globs else None
+        path_pattern = re.compile("|".join(f"(?:{part})" for part in path_parts), flags) if path_parts else None
+        return name_pattern, path_pattern
+
+    @property
+    def cache_variant(self) -> str | None:
+        """Suffix that keeps cached listings made with these rules apart from
+           others, or None when listings depend on the scanned folder (path
+           rules, one_file_system) and must not be cached.
+        """
+        if self.one_file_system or self._exclude_path is not None or self._include_path is not None:
+            return None
+        return "|" + repr(self.rules)
+
+    def for_root(self, root: str) -> "ScanFilter":
+        """Returns a copy bound to the folder being scanned."""
+        import copy
+
+        bound = copy.copy(self)
+        bound._root_prefix = root if root.endswith(os.sep) else root + os.sep
+        if self.one_file_system:
             try:
-                if entry.is_dir(follow_symlinks=False):
-                    sub_size, sub_skipped = get_folder_size(entry_path)
-                    total_size += sub_size
-                    items_skipped += sub_skipped
-                elif entry.is_file(follow_symlinks=False):
-                    try:
-                        total_size += entry_path.stat(follow_symlinks=False).st_size
-                    except OSError:
-                         items_skipped += 1
-                         continue
+                bound._root_dev = os.stat(root).st_dev
             except OSError:
-                items_skipped += 1
-                continue
+                bound._root_dev = None
+        return bound
+
+    def _relative(self, path: str) -> str:
+        relative = path[len(self._root_prefix):]
+        return relative.replace(os.sep, "/") if os.sep != "/" else relative
+
+    def allows_dir(self, name: str, path: str) -> bool:
+        """Whether the include/exclude rules let the walk descend into a
+           directory. The file-system boundary is checked by same_device().
+        """
+        if self._exclude_name is not None and self._exclude_name.match(name):
+            return False
+        if self._exclude_path is not None and self._exclude_path.match(self._relative(path)):
+            return False
+        return True
+
+    @property
+    def checks_device(self) -> bool:
+        """True if same_device() has to stat each directory (-x)."""
+        return self._root_dev is not None
+
+    def same_device(self, entry) -> bool:
+        """Whether a directory entry is on the scanned folder's file system."""
+        return self._root_dev is None or entry.stat(follow_symlinks=False).st_dev == self._root_dev
+
+    def allows_file(self, name: str, path: str) -> bool:
+        if self._exclude_name is not None and self._exclude_name.match(name):
+            return False
+        if self._exclude_path is not None and self._exclude_path.match(self._relative(path)):
+            return False
+        if not self._has_includes:
+            return True
+        if self._include_name is not None and self._include_name.match(name):
+            return True
+        return self._include_path is not None and self._include_path.match(self._relative(path)) is not None
+
+class _DirectoryTally:
+    """Totals of one directory's own entries, shared by the scan backends
+       so they count files, skipped items, filters and calls the same way.
+    """
+    __slots__ = ("allocated", "seen_inodes", "top", "scan_filter",
+                 "file_bytes", "file_count", "items_skipped", "entries", "stat_calls", "subdirs")
+
+    def __init__(self, accounting: str, seen_inodes: InodeSet | None, top: TopEntries | None,
+                 scan_filter: ScanFilter | None):
+        self.allocated = accounting != "apparent"
+        self.seen_inodes = seen_inodes
+        self.top = top
+        self.scan_filter = scan_filter
+        self.file_bytes = 0
+        self.file_count = 0
+        self.items_skipped = 0
+        self.entries = 0
+        self.stat_calls = 0
+        self.subdirs = []
+
+    def add_entries(self, it, prefix: str):
+        """Counts the os.DirEntry objects from it; prefix + name is each
+           entry's path. Totals reached so far are kept if it raises.
+        """
+        allocated, seen_inodes, top, scan_filter = self.allocated, self.seen_inodes, self.top, self.scan_filter
+        file_bytes = file_count = items_skipped = stat_calls = 0
+        entries = self.entries
+        subdirs = self.subdirs
+        try:
+            for entries, entry in enumerate(it, entries + 1):
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        path = prefix + entry.name
+                        if scan_filter is None:
+                            subdirs.append(path)
+                        elif scan_filter.allows_dir(entry.name, path):
+                            if scan_filter.checks_device:
+                                stat_calls += 1
+                                if not scan_filter.same_device(entry):
+                                    continue
+                            subdirs.append(path)
+                    elif entry.is_file(follow_symlinks=False):
+                        if scan_filter is not None and not scan_filter.allows_file(entry.name, prefix + entry.name):
+                            continue
+                        stat_calls += 1
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            items_skipped += 1
+                            continue
+                        file_count += 1
+                        if seen_inodes is not None and st.st_nlink > 1 and not seen_inodes.add(st.st_dev, st.st_ino):
+                            continue
+                        size = st.st_blocks * 512 if allocated else st.st_size
+                        file_bytes += size
+                        if top is not None and size > top.file_threshold:
+                            top.offer_file(size, prefix + entry.name)
+                except OSError:
+                    items_skipped += 1
+        finally:
+            self.file_bytes += file_bytes
+            self.file_count += file_count
+            self.items_skipped += items_skipped
+            self.stat_calls += stat_calls
+            self.entries = entries
+
+    def result(self, stats: ScanStats | None, error: OSError | None = None):
+        """Returns the lister tuple; a listing cut short by error counts
+           as one more skipped item.
+        """
+        if stats is not None:
+            stats.add_listing(self.entries, 1, self.stat_calls)
+        return self.file_bytes, self.file_count, self.items_skipped + (error is not None), self.subdirs, error
+
+def _scan_directory(dir_path: str, accounting: str = "apparent", seen_inodes: InodeSet | None = None,
+                    top: TopEntries | None = None, stats: ScanStats | None = None,
+                    scan_filter: ScanFilter | None = None):
+    """Lists a single directory without descending into it.
+       Works on the os.DirEntry objects directly: the type comes from the
+       cached d_type and the size from entry.stat(follow_symlinks=False),
+       which is fetched once per file. accounting selects the size counted
+       per file (see ACCOUNTING_MODES); with seen_inodes, files with more
+       than one link are counted only the first time they are met. Files
+       large enough to rank are offered to top, if given, and entry and
+       call counts are added to stats once the directory is done.
+       Entries rejected by scan_filter are left out before any stat() and
+       rejected subdirectories are not returned, so they are never listed.
+       Returns (file_bytes, file_count, items_skipped, subdir_paths, error).
+    """
+    tally = _DirectoryTally(accounting, seen_inodes, top, scan_filter)
+    try:
+        with os.scandir(dir_path) as it:
+            tally.add_entries(it, dir_path if dir_path.endswith(os.sep) else dir_path + os.sep)
     except OSError as e:
-         console.print(f"\n[[bold yellow]Warning[/]]: Error accessing content within [cyan]'{folder_path.name}'[/]: {e}")
-         return total_size, items_skipped + 1
-    return total_size, items_skipped
+        return tally.result(stats, e)
+    return tally.result(stats)
+
+def _scan_directory_at(dir_path: str, accounting: str = "apparent", seen_inodes: InodeSet | None = None,
+                       top: TopEntries | None = None, stats: ScanStats | None = None,
+                       scan_filter: ScanFilter | None = None):
+    """The "dirfd" scan backend: same contract as _scan_directory, but the
+       directory is opened once with os.open and listed through
+       scandir(fd), so every file's stat is an fstatat() relative to that
+       descriptor and the kernel does not resolve the full path again for
+       each entry. Needs scandir(fd) and stat(dir_fd=...) (Linux and most
+       other POSIX systems).
+    """
+    tally = _DirectoryTally(accounting, seen_inodes, top, scan_filter)
+    try:
+        fd = os.open(dir_path, _DIRFD_OPEN_FLAGS)
+    except OSError as e:
+        return tally.result(stats, e)
+    try:
+        with os.scandir(fd) as it:
+            tally.add_entries(it, dir_path if dir_path.endswith(os.sep) else dir_path + os.sep)
+    except OSError as e:
+        return tally.result(stats, e)
+    finally:
+        os.close(fd)
+    return tally.result(stats)
+
+_DIRFD_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_CLOEXEC", 0)
+
+# Directory listers selectable with --backend; all share the contract of
+# _scan_directory. "auto" picks dirfd where the platform supports it.
+SCAN_BACKENDS = {
+    "scandir": _scan_directory,
+    "dirfd": _scan_directory_at,
+}
+
+def default_scan_backend() -> str:
+    """Returns the fastest scan backend this platform supports."""
+    if os.scandir in os.supports_fd and os.stat in os.supports_dir_fd:
+        return "dirfd"
+    return "scandir"
+
+def _warn_inaccessible(dir_path, error):
+    console.print(f"\n[[bold yellow]Warning[/]]: Error accessing content within [cyan]'{os.path.basename(dir_path)}'[/]: {error}")
+
+def user_config_dir() -> Path:
+    """Returns the per-user configuration directory for DirSizer."""
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or Path.home() / "AppData" / "Roaming"
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+    return Path(base) / "DirSizer"
+
+def _sqlite_int(value: int) -> int:
+    # st_dev/st_ino are unsigned 64-bit; SQLite integers are signed.
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+class SizeCache:
+    """Persistent per-directory listing cache stored in SQLite.
+
+       Each directory is keyed by (st_dev, st_ino) and remembers the
+       st_mtime_ns it had when it was listed, the bytes, number and skipped
+       count of its own files, how many entries it held and the names of
+       its subdirectories. While a
+       directory's mtime is unchanged its listing is served from the cache,
+       so only directories whose contents changed are read again. Every
+       directory is still stat()ed, so added, removed or renamed entries
+       at any depth are picked up. A file that grows in place does not
+       touch its directory's mtime, so the cache is only used when asked
+       for with --cache.
+       Listings are stored per accounting mode; "unique" scans depend on
+       what was seen elsewhere in the tree and are never cached.
+    """
+
+    SCHEMA_VERSION = 4
+
+    FLUSH_EVERY = 10_000
+    # Listings of directories modified this recently are not cached, since a
+    # later change within the same mtime tick would go unnoticed.
+    RACY_WINDOW_NS = 2_000_000_000
+
+    def __init__(self, path: Path, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._touched = []
+        import sqlite3
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version != self.SCHEMA_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS dirs")
+            self._db.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dirs ("
+            " dev INTEGER NOT NULL, ino INTEGER NOT NULL, accounting TEXT NOT NULL,"
+            " mtime_ns INTEGER NOT NULL, file_bytes INTEGER NOT NULL, file_count INTEGER NOT NULL,"
+            " items_skipped INTEGER NOT NULL, entry_count INTEGER NOT NULL,"
+            " subdirs BLOB NOT NULL, last_used INTEGER NOT NULL,"
+            " PRIMARY KEY (dev, ino, accounting))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS dirs_last_used ON dirs (last_used)")
+        self._db.commit()
+
+    @classmethod
+    def default_path(cls) -> Path:
+        return user_config_dir() / "scan_cache.sqlite3"
+
+    def scan_directory(self, dir_path: str, accounting: str = "apparent", stats: ScanStats | None = None,
+                       lister=_scan_directory, variant: str = ""):
+        """Drop-in replacement for _scan_directory that consults the cache.
+           lister is the scan backend used for directories that must be read;
+           variant tells apart listings made with different scan filters.
+        """
+        if stats is not None:
+            stats.add_listing(0, 0, 1)
+        try:
+            st = os.stat(dir_path, follow_symlinks=False)
+        except OSError:
+            return lister(dir_path, accounting, stats=stats)
+        key = (_sqlite_int(st.st_dev), _sqlite_int(st.st_ino), accounting + variant)
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT mtime_ns, file_bytes, file_count, items_skipped, entry_count, subdirs"
+                " FROM dirs WHERE dev=? AND ino=? AND accounting=?", key
+            ).fetchone()
+        if row is not None and row[0] == st.st_mtime_ns:
+            with self._lock:
+                self.hits += 1
+                self._touched.append(key)
+                if len(self._touched) >= self.FLUSH_EVERY:
+                    self._write_pending()
+            names = row[5].split(b"\0") if row[5] else []
+            if stats is not None:
+                stats.add_listing(row[4], 0, 0, cache_hit=True)
+            return row[1], row[2], row[3], [os.path.join(dir_path, os.fsdecode(n)) for n in names], None
+
+        # The listing's own counters tell how many entries to store.
+        listing_stats = ScanStats()
+        file_bytes, file_count, items_skipped, subdirs, error = lister(dir_path, accounting, stats=listing_stats)
+        if stats is not None:
+            stats.add_listing(listing_stats.entries, listing_stats.listing_calls, listing_stats.stat_calls)
+        with self._lock:
+            self.misses += 1
+            if error is None and time.time_ns() - st.st_mtime_ns > self.RACY_WINDOW_NS:
+                names = b"\0".join(os.fsencode(os.path.basename(d)) for d in subdirs)
+                self._pending.append(key + (st.st_mtime_ns, file_bytes, file_count, items_skipped,
+                                            listing_stats.entries, names))
+                if len(self._pending) >= self.FLUSH_EVERY:
+                    self._write_pending()
+        return file_bytes, file_count, items_skipped, subdirs, error
+
+    def _write_pending(self):
+        now = int(time.time())
+        if self._pending:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row + (now,) for row in self._pending],
+            )
+            self._pending.clear()
+        if self._touched:
+            self._db.executemany("UPDATE dirs SET last_used=? WHERE dev=? AND ino=? AND accounting=?",
+                                 [(now,) + key for key in self._touched])
+            self._touched.clear()
+        self._db.commit()
+
+    def flush(self):
+        """Writes pending entries and last-used stamps to disk."""
+        with self._lock:
+            self._write_pending()
+
+    def evict(self):
+        """Drops the least recently used directories once the cache holds
+           more than max_entries of them.
+        """
+        with self._lock:
+            self._write_pending()
+            (count,) = self._db.execute("SELECT COUNT(*) FROM dirs").fetchone()
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM dirs WHERE rowid IN (SELECT rowid FROM dirs ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._touched.clear()
+            self._db.execute("DELETE FROM dirs")
+            self._db.commit()
+            self._db.execute("VACUUM")
+
+    def close(self):
+        self.evict()
+        self._db.close()
+
+def _walk_serial(root: str, lister, visit):
+    """Walks the tree with an explicit stack of directory paths, so deep
+       trees cannot hit the recursion limit.
+    """
+    stack = [(root, None)]
+    while stack:
+        dir_path, parent = stack.pop()
+        file_bytes, file_count, skipped, subdirs, error = lister(dir_path)
+        if error is not None:
+            _warn_inaccessible(dir_path, error)
+        token = visit(dir_path, parent, file_bytes, file_count, skipped, len(subdirs), error)
+        stack.extend((subdir, token) for subdir in subdirs)
+
+def _walk_parallel(root: str, workers: int, lister, visit):
+    """Fans every directory listing out to a shared thread pool.
+       Each directory is its own task, so idle workers pick up the next
+       pending listing at any depth instead of waiting on a single
+       top-level subfolder. visit() always runs on the calling thread.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    completed = queue.SimpleQueue()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def submit(dir_path, parent):
+            future = pool.submit(lister, dir_path)
+            future.add_done_callback(lambda f, p=dir_path, t=parent: completed.put((p, t, f)))
+
+        submit(root, None)
+        outstanding = 1
+        try:
+            while outstanding:
+                dir_path, parent, future = completed.get()
+                outstanding -= 1
+                file_bytes, file_count, skipped, subdirs, error = future.result()
+                if error is not None:
+                    _warn_inaccessible(dir_path, error)
+                token = visit(dir_path, parent, file_bytes, file_count, skipped, len(subdirs), error)
+                for subdir in subdirs:
+                    submit(subdir, token)
+                outstanding += len(subdirs)
+        except BaseException:
+            # On Ctrl+C or an error, drop the queued listings instead of
+            # letting the pool run them all before it shuts down.
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+class _DaemonThreadPool:
+    """Minimal executor for the asyncio walker. Its threads are daemons, so
+       a listing stuck on a dead network mount cannot keep the process
+       alive at exit, and a replacement thread can be added for each one
+       that is given up on.
+    """
+
+    def __init__(self, threads: int):
+        self._tasks = queue.SimpleQueue()
+        self._threads = 0
+        for _ in range(threads):
+            self.add_thread()
+
+    def add_thread(self):
+        threading.Thread(target=self._run, name="DirSizer-async-lister", daemon=True).start()
+        self._threads += 1
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+
+        future = Future()
+        self._tasks.put((future, fn, args))
+        return future
+
+    def _run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+    def shutdown(self):
+        """Asks every thread to exit once it is idle; stuck ones are left behind."""
+        for _ in range(self._threads):
+            self._tasks.put(None)
+        self._threads = 0
+
+def _mount_points():
+    """Returns the mount points of the system, longest first, or an empty
+       list where /proc/self/mounts is not available.
+    """
+    mounts = []
+    try:
+        with open("/proc/self/mounts", encoding="utf-8", errors="surrogateescape") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2:
+                    # Spaces, tabs and backslashes are octal-escaped (\040 etc.).
+                    mounts.append(re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), fields[1]))
+    except OSError:
+        return []
+    return sorted(set(mounts), key=len, reverse=True)
+
+def _mount_of(dir_path: str, mounts):
+    """Returns the mount point holding dir_path, judged by path prefix so no
+       extra round trip to the file system is needed.
+    """
+    for mount in mounts:
+        if dir_path == mount or dir_path.startswith(mount if mount.endswith(os.sep) else mount + os.sep):
+            return mount
+    return ""
+
+def _walk_async(root: str, lister, visit, max_in_flight: int, max_per_mount: int, timeout: float | None):
+    """Walks the tree from an asyncio event loop, keeping up to
+       max_in_flight listings running at once (at most max_per_mount of
+       them on any one mount) in a thread pool. This keeps high-latency
+       network file systems busy without letting one slow share starve the
+       others. A listing that does not finish within timeout seconds is
+       given up on: the directory counts as one skipped item, its subtree
+       is not walked and the rest of the scan carries on. visit() runs on
+       the calling thread, like in the other walkers.
+    """
+    import asyncio
+    import collections
+    import errno
+
+    async def walk():
+        mounts = _mount_points()
+        pending = {}  # mount -> deque of (dir_path, parent_token)
+        load = collections.Counter()
+        in_flight = {}  # task -> (dir_path, parent_token, mount)
+        pool = _DaemonThreadPool(max_in_flight)
+        # Threads left behind by timed-out listings; past this limit no more
+        # replacements are started and new listings simply queue up.
+        max_abandoned = max_in_flight * 4
+        abandoned = 0
+
+        async def list_directory(dir_path):
+            nonlocal abandoned
+            future = asyncio.wrap_future(pool.submit(lister, dir_path))
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                if abandoned < max_abandoned:
+                    abandoned += 1
+                    pool.add_thread()
+                error = TimeoutError(errno.ETIMEDOUT, f"No response after {timeout:g} s, subtree skipped")
+                return 0, 0, 1, [], error
+
+        def enqueue(dir_path, parent):
+            mount = _mount_of(dir_path, mounts)
+            queue_for_mount = pending.get(mount)
+            if queue_for_mount is None:
+                queue_for_mount = pending[mount] = collections.deque()
+            queue_for_mount.append((dir_path, parent))
+
+        def dispatch():
+            for mount, queue_for_mount in list(pending.items()):
+                while queue_for_mount and load[mount] < max_per_mount and len(in_flight) < max_in_flight:
+                    dir_path, parent = queue_for_mount.popleft()
+                    load[mount] += 1
+                    task = asyncio.ensure_future(list_directory(dir_path))
+                    in_flight[task] = (dir_path, parent, mount)
+                if not queue_for_mount:
+                    del pending[mount]
+                if len(in_flight) >= max_in_flight:
+                    return
+
+        enqueue(root, None)
+        try:
+            while pending or in_flight:
+                dispatch()
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    dir_path, parent, mount = in_flight.pop(task)
+                    load[mount] -= 1
+                    file_bytes, file_count, skipped, subdirs, error = task.result()
+                    if error is not None:
+                        _warn_inaccessible(dir_path, error)
+                    token = visit(dir_path, parent, file_bytes, file_count, skipped, len(subdirs), error)
+                    for subdir in subdirs:
+                        enqueue(subdir, token)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            pool.shutdown()
+
+    asyncio.run(walk())
+
+class _PendingDirectory:
+    """A directory whose subtree is still being walked."""
+    __slots__ = ("path", "size", "remaining", "parent")
+
+    def __init__(self, path, size, remaining, parent):
+        self.path = path
+        self.size = size
+        self.remaining = remaining
+        self.parent = parent
+
+def _with_subtree_totals(visit, on_directory_done):
+    """Wraps a walker visit callback so that on_directory_done(path, size)
+       is called with each directory's subtree total once its last
+       descendant has been listed. Only directories still in progress are
+       kept, so memory follows the walk frontier, not the tree size.
+    """
+    def wrapped(dir_path, parent, file_bytes, file_count, skipped, subdir_count, error):
+        parent_node, parent_token = parent if parent is not None else (None, None)
+        # remaining counts the pending subdirectories plus this directory's own listing.
+        own = _PendingDirectory(dir_path, file_bytes, subdir_count + 1, parent_node)
+        token = visit(dir_path, parent_token, file_bytes, file_count, skipped, subdir_count, error)
+        node = own
+        while node is not None:
+            node.remaining -= 1
+            if node.remaining:
+                break
+            on_directory_done(node.path, node.size)
+            if node.parent is not None:
+                node.parent.size += node.size
+            node = node.parent
+        return (own, token)
+    return wrapped
+
+def walk_directory_tree(folder_path, visit, workers: int | None = None, cache: SizeCache | None = None,
+                        accounting: str | None = None, top: TopEntries | None = None,
+                        stats: ScanStats | None = None):
+    """Lists every directory below folder_path exactly once.
+
+       visit(dir_path, parent_token, file_bytes, file_count, items_skipped, subdir_count, error)
+       is called for each directory, parents before their children; the
+       value it returns is passed as parent_token to that directory's
+       subdirectories (None for the root). file_bytes, file_count and
+       items_skipped cover only the directory's own entries; error is the OSError that
+       cut its listing short, if any. In "unique" accounting, a file linked
+       from several directories is credited to whichever is listed first.
+       With top, the largest files and subdirectories are collected too;
+       such scans bypass the size cache, which does not keep file sizes.
+       With stats, live counters are kept and reported as the walk runs.
+       The include/exclude rules in scan_settings["filter"] are applied
+       while listing, so excluded subtrees are never read.
+    """
+    import functools
+
+    if workers is None:
+        workers = scan_settings["workers"]
+    if cache is None:
+        cache = scan_settings["cache"]
+    if accounting is None:
+        accounting = scan_settings["accounting"]
+    root = os.fspath(folder_path)
+    if top is not None:
+        def directory_done(path, size):
+            if path != root:
+                top.offer_dir(size, path)
+
+        cache = None
+        visit = _with_subtree_totals(visit, directory_done)
+    if stats is not None:
+        counted_visit = visit
+
+        def visit(dir_path, parent, file_bytes, file_count, skipped, subdir_count, error):
+            stats.add_directory(file_bytes, skipped, error)
+            return counted_visit(dir_path, parent, file_bytes, file_count, skipped, subdir_count, error)
+    backend_name = scan_settings["backend"]
+    backend = SCAN_BACKENDS[default_scan_backend() if backend_name == "auto" else backend_name]
+    variant = ""
+    if scan_settings["filter"] is not None:
+        scan_filter = scan_settings["filter"].for_root(root)
+        backend = functools.partial(backend, scan_filter=scan_filter)
+        variant = scan_filter.cache_variant
+        if variant is None:
+            cache = None
+    if accounting == "unique":
+        lister = functools.partial(backend, accounting=accounting, seen_inodes=InodeSet(), top=top, stats=stats)
+        cache = None
+    elif cache is not None:
+        lister = functools.partial(cache.scan_directory, accounting=accounting, stats=stats, lister=backend, variant=variant)
+    else:
+        lister = functools.partial(backend, accounting=accounting, top=top, stats=stats)
+    try:
+        if scan_settings["async"]:
+            _walk_async(root, lister, visit, scan_settings["max_in_flight"], scan_settings["max_per_mount"],
+                        scan_settings["timeout"])
+        elif workers > 1:
+            _walk_parallel(root, workers, lister, visit)
+        else:
+            _walk_serial(root, lister, visit)
+    finally:
+        if cache is not None:
+            cache.flush()
+        if stats is not None:
+            stats.finish()
+
+def get_folder_size(folder_path: Path, workers: int | None = None, cache: SizeCache | None = None,
+                    accounting: str | None = None, top: TopEntries | None = None,
+                    stats: ScanStats | None = None):
+    """Calculates the total size of a folder including all its subfolders and files.
+       Accepts a pathlib.Path or string. Returns (total_size, items_skipped).
+       With more than one worker, directories are listed concurrently by a
+       thread pool; the result is the same as the serial walk. Unchanged
+       directories are served from the size cache when one is configured.
+       accounting picks one of ACCOUNTING_MODES (default: scan_settings).
+       Pass a TopEntries as top to also collect the largest files and
+       directories inside the folder, and a ScanStats as stats for live
+       counters.
+    """
+    totals = [0, 0]
+
+    def visit(dir_path, parent, file_bytes, file_count, skipped, subdir_count, error):
+        totals[0] += file_bytes
+        totals[1] += skipped
+
+    walk_directory_tree(folder_path, visit, workers, cache, accounting, top, stats)
+    return totals[0], totals[1]
+
+def _numpy():
+    """Returns numpy if it is installed, else None. SizeTree uses it for
+       bulk operations over all nodes and falls back to plain loops.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def _numpy_column(np, column):
+    """Wraps an array('...') or a cast memoryview as a numpy array without copying."""
+    return np.frombuffer(column, dtype=getattr(column, "typecode", None) or column.format)
+
+def _align8(offset: int) -> int:
+    return (offset + 7) & ~7
+
+class NameTable:
+    """Interned directory names: each distinct name is stored once and nodes
+       refer to it by number, so the thousands of "src", ".git" or
+       "node_modules" directories of a big tree share a single string.
+       Names of a tree loaded from disk stay in the mapped file and are
+       only decoded when asked for.
+    """
+
+    def __init__(self, blob=None, offsets=None):
+        self._blob = blob
+        self._offsets = offsets
+        self._loaded = len(offsets) - 1 if offsets is not None else 0
+        self._decoded = None
+        self._names = []
+        self._ids = {}
+
+    def __len__(self):
+        return self._loaded + len(self._names)
+
+    def __getitem__(self, name_id: int) -> str:
+        if name_id < self._loaded:
+            if self._decoded is not None:
+                return self._decoded[name_id]
+            # Each stored name is followed by a NUL separator.
+            return os.fsdecode(bytes(self._blob[self._offsets[name_id]:self._offsets[name_id + 1] - 1]))
+        return self._names[name_id - self._loaded]
+
+    def as_list(self) -> list[str]:
+        """Returns every name indexed by id, for bulk lookups; do not modify
+           it. Names loaded from disk are decoded in a single pass.
+        """
+        if not self._loaded:
+            return self._names
+        if self._decoded is None:
+            text = bytes(self._blob).decode(sys.getfilesystemencoding(), sys.getfilesystemencodeerrors())
+            self._decoded = text.split("\0")[:self._loaded]
+        return self._decoded + self._names
+
+    def intern(self, name: str) -> int:
+        # Names loaded from disk are not indexed, so a name already in the
+        # file may be added again; ids stay valid either way.
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = len(self)
+            self._names.append(name)
+            self._ids[name] = name_id
+        return name_id
+
+    def encode(self):
+        """Returns (blob, offsets): every name fsencoded and followed by a NUL,
+           back to back, and an array('Q') where name i plus its NUL spans
+           blob[offsets[i]:offsets[i + 1]].
+        """
+        from array import array
+
+        encoded = [os.fsencode(name) for name in self.as_list()]
+        offsets = array("Q", [0])
+        end = 0
+        for name in encoded:
+            end += len(name) + 1
+            offsets.append(end)
+        return b"\0".join(encoded) + (b"\0" if encoded else b""), offsets
+
+class SizeTree:
+    """In-memory result of one scan: a node per directory with the bytes,
+       number and skipped items of its own files, plus subtree totals once
+       finalize() has run. Node 0 is the scanned root and every node is
+       stored after its parent.
+
+       Nodes are kept as columns of packed arrays (parent index, interned
+       name id, own and subtree totals) instead of an object per
+       directory, roughly 70 bytes per directory, so trees of millions of
+       directories stay small. Rollups, per-depth sums and child indexes
+       run as numpy array operations when numpy is installed. save()
+       writes the columns to a file that load() maps back into memory
+       without parsing it.
+    """
+
+    FILE_MAGIC = b"DSZTREE1"
+    FILE_VERSION = 2
+    COLUMNS = (
+        ("parents", "i"),
+        ("name_ids", "I"),
+        ("file_bytes", "Q"),
+        ("file_counts", "Q"),
+        ("skipped", "Q"),
+        ("sizes", "Q"),
+        ("file_totals", "Q"),
+        ("dir_totals", "Q"),
+        ("skipped_totals", "Q"),
+    )
+
+    def __init__(self, root_path, accounting: str = "apparent"):
+        from array import array
+
+        self.root_path = Path(root_path)
+        self.scanned_at = time.time()
+        self.accounting = accounting
+        self.name_table = NameTable()
+        for column, typecode in self.COLUMNS:
+            setattr(self, column, array(typecode))
+        self.top = None
+        self._child_starts = None
+        self._child_nodes = None
+        self._mapping = None
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add(self, parent: int, name: str, file_bytes: int, file_count: int, skipped: int) -> int:
+        self.parents.append(parent)
+        self.name_ids.append(self.name_table.intern(name))
+        self.file_bytes.append(file_bytes)
+        self.file_counts.append(file_count)
+        self.skipped.append(skipped)
+        self._child_starts = None
+        return len(self.parents) - 1
+
+    def name(self, index: int) -> str:
+        return self.name_table[self.name_ids[index]]
+
+    def item_count(self, index: int) -> int:
+        """Files and directories below a node."""
+        return self.file_totals[index] + self.dir_totals[index]
+
+    def finalize(self):
+        """Rolls each directory's own totals up into all of its ancestors."""
+        from array import array
+
+        np = _numpy()
+        if np is not None and len(self) > 1:
+            self._finalize_numpy(np)
+            return
+        sizes = array("Q", self.file_bytes)
+        files = array("Q", self.file_counts)
+        skipped = array("Q", self.skipped)
+        dirs = array("Q", bytes(8 * len(self)))
+        parents = self.parents
+        for i in range(len(sizes) - 1, 0, -1):
+            parent = parents[i]
+            sizes[parent] += sizes[i]
+            files[parent] += files[i]
+            skipped[parent] += skipped[i]
+            dirs[parent] += dirs[i] + 1
+        self.sizes, self.file_totals, self.skipped_totals, self.dir_totals = sizes, files, skipped, dirs
+
+    def _finalize_numpy(self, np):
+        from array import array
+
+        parents = _numpy_column(np, self.parents)
+        depths = self._numpy_depths(np)
+        # Add each level into the one above it, deepest first, so every
+        # node is complete before it is added to its parent.
+        order = np.argsort(depths, kind="stable")
+        level_starts = np.searchsorted(depths[order], np.arange(int(depths.max()) + 2))
+        totals = [_numpy_column(np, column).copy() for column in (self.file_bytes, self.file_counts, self.skipped)]
+        dirs = np.zeros(len(self), dtype=np.uint64)
+        for level in range(len(level_starts) - 2, 0, -1):
+            nodes = order[level_starts[level]:level_starts[level + 1]]
+            targets = parents[nodes]
+            for column in totals:
+                np.add.at(column, targets, column[nodes])
+            np.add.at(dirs, targets, dirs[nodes] + np.uint64(1))
+        self.sizes, self.file_totals, self.skipped_totals = (array("Q", column.tobytes()) for column in totals)
+        self.dir_totals = array("Q", dirs.tobytes())
+
+    def _numpy_depths(self, np):
+        # Pointer doubling: each pass adds the distance to the current
+        # ancestor and jumps to that ancestor's ancestor, so it takes about
+        # log2(tree height) passes.
+        ancestors = _numpy_column(np, self.parents).astype(np.int64)
+        depths = (ancestors >= 0).astype(np.int64)
+        while True:
+            pending = np.flatnonzero(ancestors >= 0)
+            if not len(pending):
+                return depths
+            jump = ancestors[pending]
+            depths[pending] += depths[jump]
+            ancestors[pending] = ancestors[jump]
+
+    def depths(self):
+        """Returns each node's depth below the root (0 for the root)."""
+        from array import array
+
+        np = _numpy()
+        if np is not None and len(self) > 1:
+            return array("I", self._numpy_depths(np).astype(np.uint32).tobytes())
+        depths = array("I", bytes(4 * len(self)))
+        parents = self.parents
+        for i in range(1, len(depths)):
+            depths[i] = depths[parents[i]] + 1
+        return depths
+
+    def depth_totals(self) -> list[tuple[int, int, int]]:
+        """Returns (directories, file_bytes, files) for each depth, root first,
+           counting only the directories' own files.
+        """
+        np = _numpy()
+        if np is not None and len(self) > 1:
+            depths = self._numpy_depths(np)
+            levels = int(depths.max()) + 1
+            dirs = np.bincount(depths, minlength=levels)
+            columns = []
+            for column in (self.file_bytes, self.file_counts):
+                sums = np.zeros(levels, dtype=np.uint64)
+                np.add.at(sums, depths, _numpy_column(np, column))
+                columns.append(sums)
+            return [(int(d), int(b), int(f)) for d, b, f in zip(dirs, *columns)]
+        totals = []
+        for index, depth in enumerate(self.depths()):
+            if depth == len(totals):
+                totals.append([0, 0, 0])
+            level = totals[depth]
+            level[0] += 1
+            level[1] += self.file_bytes[index]
+            level[2] += self.file_counts[index]
+        return [tuple(level) for level in totals]
+
+    def _index_children(self):
+        """Builds a compact child index: the children of node i are
+           _child_nodes[_child_starts[i]:_child_starts[i + 1]], in the order
+           they were added.
+        """
+        from array import array
+
+        count = len(self)
+        np = _numpy()
+        if np is not None and count > 1:
+            parents = _numpy_column(np, self.parents)[1:]
+            order = np.argsort(parents, kind="stable")
+            starts = np.searchsorted(parents[order], np.arange(count + 1))
+            self._child_nodes = array("I", (order + 1).astype(np.uint32).tobytes())
+            self._child_starts = array("I", starts.astype(np.uint32).tobytes())
+            return
+        starts = array("I", bytes(4 * (count + 1)))
+        parents = self.parents
+        for i in range(1, count):
+            starts[parents[i] + 1] += 1
+        for i in range(count):
+            starts[i + 1] += starts[i]
+        nodes = array("I", bytes(4 * max(count - 1, 0)))
+        fill = array("I", starts)
+        for i in range(1, count):
+            parent = parents[i]
+            nodes[fill[parent]] = i
+            fill[parent] += 1
+        self._child_nodes = nodes
+        self._child_starts = starts
+
+    def child_index(self):
+        """Returns (starts, nodes): the children of node i are
+           nodes[starts[i]:starts[i + 1]]. For bulk walks over the tree.
+        """
+        if self._child_starts is None:
+            self._index_children()
+        return self._child_starts, self._child_nodes
+
+    def children(self, index: int = 0) -> list[int]:
+        starts, nodes = self.child_index()
+        return list(nodes[starts[index]:starts[index + 1]])
+
+    def sorted_children(self, index: int = 0, by: str = "size") -> list[int]:
+        """Returns a node's children largest first by "size" or "count"
+           (files and directories below), or alphabetically by "name".
+        """
+        children = self.children(index)
+        if by == "name":
+            return sorted(children, key=lambda i: self.name(i).lower())
+        key = self.sizes.__getitem__ if by == "size" else self.item_count
+        return sorted(children, key=key, reverse=True)
+
+    def path_of(self, index: int) -> Path:
+        parts = []
+        while index > 0:
+            parts.append(self.name(index))
+            index = self.parents[index]
+        return self.root_path.joinpath(*reversed(parts))
+
+    def find(self, path) -> int | None:
+        """Returns the node index for a directory inside this tree, or None."""
+        try:
+            relative = Path(path).relative_to(self.root_path)
+        except ValueError:
+            return None
+        index = 0
+        for part in relative.parts:
+            for child in self.children(index):
+                if self.name(child) == part:
+                    index = child
+                    break
+            else:
+                return None
+        return index
+
+    def rename_node(self, index: int, new_name: str):
+        self.name_ids[index] = self.name_table.intern(new_name)
+
+    def save(self, path):
+        """Writes the finalized tree to path. The file holds a small JSON
+           header followed by the raw columns and names, 8-byte aligned, so
+           load() can map it straight back into memory.
+        """
+        import json
+
+        blob, name_offsets = self.name_table.encode()
+        sections = [(column, getattr(self, column)) for column, _ in self.COLUMNS]
+        sections += [("name_offsets", name_offsets), ("names", blob)]
+        layout = {}
+        offset = 0
+        for column, data in sections:
+            data = memoryview(data)
+            layout[column] = {"offset": offset, "format": data.format, "bytes": data.nbytes}
+            offset = _align8(offset + data.nbytes)
+        header = json.dumps({
+            "version": self.FILE_VERSION,
+            "root_path": os.fspath(self.root_path),
+            "scanned_at": self.scanned_at,
+            "accounting": self.accounting,
+            "byteorder": sys.byteorder,
+            "sections": layout,
+        }).encode()
+        data_start = _align8(16 + len(header))
+
+        path = Path(path)
+        partial = path.with_name(path.name + ".partial")
+        with open(partial, "wb") as f:
+            f.write(self.FILE_MAGIC + len(header).to_bytes(8, "little") + header)
+            for column, data in sections:
+                f.seek(data_start + layout[column]["offset"])
+                f.write(data)
+            f.truncate(data_start + offset)
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path) -> "SizeTree":
+        """Maps a tree written by save() into memory. Columns are read from
+           the file on demand, so even huge trees open instantly; changes
+           such as renames stay in memory. Raises ValueError if path is not
+           a saved tree and OSError if it cannot be read.
+        """
+        import json
+        import mmap
+
+        with open(path, "rb") as f:
+            if f.read(len(cls.FILE_MAGIC)) != cls.FILE_MAGIC:
+                raise ValueError(f"{path} is not a saved DirSizer tree")
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        header_length = int.from_bytes(mapping[8:16], "little")
+        header = json.loads(mapping[16:16 + header_length])
+        if header["version"] != cls.FILE_VERSION or header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was saved by an incompatible version or platform")
+        data = memoryview(mapping)[_align8(16 + header_length):]
+
+        def section(column):
+            spec = header["sections"][column]
+            view = data[spec["offset"]:spec["offset"] + spec["bytes"]]
+            return view if spec["format"] == "B" else view.cast(spec["format"])
+
+        tree = cls(header["root_path"], header["accounting"])
+        tree.scanned_at = header["scanned_at"]
+        for column, _ in cls.COLUMNS:
+            setattr(tree, column, section(column))
+        tree.name_table = NameTable(section("names"), section("name_offsets"))
+        tree._mapping = mapping
+        return tree
+
+class TreeDiff:
+    """What changed between two scans of a directory, as found by
+       diff_size_trees(). Directories present in both are ranked by
+       absolute and relative growth; directories present in only one are
+       new or deleted subtrees, reported once at their top. Each ranking
+       keeps at most limit entries in a bounded heap.
+    """
+
+    def __init__(self, old: SizeTree, new: SizeTree, old_start: int = 0, new_start: int = 0, limit: int = 20,
+                 min_relative_size: int = 0):
+        self.old = old
+        self.new = new
+        self.old_start = old_start
+        self.new_start = new_start
+        self.limit = limit
+        self.min_relative_size = min_relative_size
+        self.compared = 0
+        self.added_count = 0
+        self.removed_count = 0
+        self._grown = []
+        self._relative = []
+        self._added = []
+        self._removed = []
+
+    def _push(self, heap, key, node):
+        import heapq
+
+        if len(heap) < self.limit:
+            heapq.heappush(heap, (key, node))
+        elif key > heap[0][0]:
+            heapq.heapreplace(heap, (key, node))
+
+    def add_growth(self, old_index: int, new_index: int, depth: int):
+        """Records a directory found in both scans that grew. On equal growth
+           the deeper directory ranks first, since it pinpoints the change.
+        """
+        old_size = self.old.sizes[old_index]
+        new_size = self.new.sizes[new_index]
+        self._push(self._grown, (new_size - old_size, depth), (old_index, new_index))
+        if old_size and new_size >= self.min_relative_size:
+            self._push(self._relative, ((new_size - old_size) / old_size, depth), (old_index, new_index))
+
+    def add_new(self, new_index: int):
+        self.added_count += 1
+        self._push(self._added, self.new.sizes[new_index], new_index)
+
+    def add_deleted(self, old_index: int):
+        self.removed_count += 1
+        self._push(self._removed, self.old.sizes[old_index], old_index)
+
+    def _changes(self, heap):
+        return [(self.old.sizes[old_index], self.new.sizes[new_index],
+                 _relative_path(self.new, new_index, self.new_start))
+                for _, (old_index, new_index) in sorted(heap, reverse=True)]
+
+    def largest_growth(self) -> list[tuple[int, int, str]]:
+        """(old_size, new_size, path) of the directories that grew most, in bytes."""
+        return self._changes(self._grown)
+
+    def largest_relative_growth(self) -> list[tuple[int, int, str]]:
+        """(old_size, new_size, path) of the directories that grew most relative to their old size."""
+        return self._changes(self._relative)
+
+    def new_subtrees(self) -> list[tuple[int, str]]:
+        return [(size, _relative_path(self.new, index, self.new_start)) for size, index in sorted(self._added, reverse=True)]
+
+    def deleted_subtrees(self) -> list[tuple[int, str]]:
+        return [(size, _relative_path(self.old, index, self.old_start)) for size, index in sorted(self._removed, reverse=True)]
+
+def _relative_path(tree: SizeTree, index: int, start: int) -> str:
+    parts = []
+    while index != start and index > 0:
+        parts.append(tree.name(index))
+        index = tree.parents[index]
+    return os.path.join(*reversed(parts)) if parts else "."
+
+def diff_size_trees(old: SizeTree, new: SizeTree, old_start: int = 0, new_start: int = 0, limit: int = 20,
+                    min_relative_size: int = 0) -> TreeDiff:
+    """Compares the subtree at old_start in old with the one at new_start in
+       new. Both trees are walked together; at each directory the two
+       child lists are sorted by name and merged in one pass, so matching
+       every directory takes linear time overall and no path strings are
+       built except for the directories that are reported.
+       Relative growth only ranks directories of at least min_relative_size
+       bytes, so tiny folders doubling in size do not crowd out the list.
+    """
+    diff = TreeDiff(old, new, old_start, new_start, limit, min_relative_size)
+    old_starts, old_nodes = old.child_index()
+    new_starts, new_nodes = new.child_index()
+    old_names, old_name_ids, old_sizes = old.name_table.as_list(), old.name_ids, old.sizes
+    new_names, new_name_ids, new_sizes = new.name_table.as_list(), new.name_ids, new.sizes
+    stack = [(old_start, new_start, 0)]
+    while stack:
+        old_index, new_index, depth = stack.pop()
+        diff.compared += 1
+        if new_sizes[new_index] > old_sizes[old_index]:
+            diff.add_growth(old_index, new_index, depth)
+        old_first, old_end = old_starts[old_index], old_starts[old_index + 1]
+        new_first, new_end = new_starts[new_index], new_starts[new_index + 1]
+        if old_first == old_end and new_first == new_end:
+            continue
+        old_children = sorted([(old_names[old_name_ids[child]], child) for child in old_nodes[old_first:old_end]])
+        new_children = sorted([(new_names[new_name_ids[child]], child) for child in new_nodes[new_first:new_end]])
+        i = j = 0
+        while i < len(old_children) and j < len(new_children):
+            old_name, old_child = old_children[i]
+            new_name, new_child = new_children[j]
+            if old_name == new_name:
+                stack.append((old_child, new_child, depth + 1))
+                i += 1
+                j += 1
+            elif old_name < new_name:
+                diff.add_deleted(old_child)
+                i += 1
+            else:
+                diff.add_new(new_child)
+                j += 1
+        for _, old_child in old_children[i:]:
+            diff.add_deleted(old_child)
+        for _, new_child in new_children[j:]:
+            diff.add_new(new_child)
+    return diff
+
+class SubfolderTotals:
+    """Running totals for one immediate subfolder of a scan."""
+    __slots__ = ("name", "size", "skipped", "remaining", "error_count", "errors")
+
+    # Error messages kept per subfolder; further errors are only counted.
+    MAX_ERRORS = 10
+
+    def __init__(self, name: str):
+        self.name = name
+        self.size = 0
+        self.skipped = 0
+        self.remaining = 1
+        self.error_count = 0
+        self.errors = []
+
+def scan_subfolders(folder_path, on_subfolder_done=None, tree: SizeTree | None = None,
+                    workers: int | None = None, cache: SizeCache | None = None, top: TopEntries | None = None,
+                    stats: ScanStats | None = None):
+    """Walks folder_path once and calls on_subfolder_done(totals, subfolder_count)
+       with a SubfolderTotals as soon as each immediate subfolder's whole
+       subtree has been listed, without waiting for the rest of the scan.
+       Only subfolders still being walked are held in memory, unless a
+       SizeTree is passed in to record every directory.
+       Returns the OSError that prevented listing folder_path itself, or None.
+    """
+    root_state = {"subfolders": 0, "error": None}
+
+    def visit(dir_path, parent, file_bytes, file_count, skipped, subdir_count, error):
+        if parent is None:
+            root_state["subfolders"] = subdir_count
+            root_state["error"] = error
+            index = tree.add(-1, tree.root_path.name, file_bytes, file_count, skipped) if tree is not None else None
+            return (index, None)
+        parent_index, top = parent
+        index = tree.add(parent_index, os.path.basename(dir_path), file_bytes, file_count, skipped) if tree is not None else None
+        if top is None:
+            top = SubfolderTotals(os.path.basename(dir_path))
+        top.size += file_bytes
+        top.skipped += skipped
+        top.remaining += subdir_count - 1
+        if error is not None:
+            top.error_count += 1
+            if len(top.errors) < SubfolderTotals.MAX_ERRORS:
+                top.errors.append(f"{dir_path}: {error.strerror or error}")
+        if top.remaining == 0 and on_subfolder_done is not None:
+            on_subfolder_done(top, root_state["subfolders"])
+        return (index, top)
+
+    walk_directory_tree(folder_path, visit, workers, cache, top=top, stats=stats)
+    return root_state["error"]
+
+def scan_size_tree(folder_path, workers: int | None = None, cache: SizeCache | None = None,
+                   on_subfolder_done=None, top: TopEntries | None = None,
+                   stats: ScanStats | None = None) -> SizeTree:
+    """Scans folder_path once and returns a finalized SizeTree with a total
+       for every directory. on_subfolder_done, top and stats are passed to
+       scan_subfolders(); top is kept on the tree for later reports.
+    """
+    tree = SizeTree(folder_path, scan_settings["accounting"])
+    tree.top = top
+    scan_subfolders(folder_path, on_subfolder_done, tree, workers, cache, top, stats)
+    tree.finalize()
+    return tree
+
+# Trees scanned earlier in this session, keyed by their resolved root path,
+# so that listing and then renaming the same parent walks the disk once.
+session_trees: dict[str, SizeTree] = {}
+# Renames write sizes into folder names for good, so they only reuse a
+# session tree scanned this recently.
+RENAME_TREE_MAX_AGE = 300
+
+def find_session_tree(folder_path: Path):
+    """Returns (tree, node_index) for the most specific tree scanned this
+       session that contains folder_path, or (None, None). Only trees
+       rooted at folder_path or one of its parents are looked at, so the
+       cost depends on the depth of the path, not on the number of trees.
+    """
+    for root in (folder_path, *folder_path.parents):
+        tree = session_trees.get(str(root))
+        if tree is not None:
+            index = tree.find(folder_path)
+            if index is not None:
+                return tree, index
+    return None, None
+
+def forget_session_trees(folder_path: Path):
+    """Drops session trees rooted at or below folder_path."""
+    for key, tree in list(session_trees.items()):
+        if tree.root_path == folder_path or folder_path in tree.root_path.parents:
+            del session_trees[key]
+
+def note_session_rename(old_path: Path, new_path: Path):
+    """Keeps session trees in step with a folder renamed on disk."""
+    forget_session_trees(old_path)
+    for root in old_path.parents:
+        tree = session_trees.get(str(root))
+        index = tree.find(old_path) if tree is not None else None
+        if index is not None:
+            tree.rename_node(index, new_path.name)
 
 def select_directory(title="Select Folder") -> str | None:
     """Opens a dialog to select a directory. Returns path as string or None."""
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.withdraw()
     root.attributes('-topmost', True)
@@ -78,208 +1734,1113 @@ def select_directory(title="Select Folder") -> str | None:
     root.destroy()
     return folder_selected
 
-def list_folders_with_sizes():
-    """Action 1: List subfolders with sizes using Rich."""
-    console.print(Rule("[bold cyan]List Subfolder Sizes[/]"))
-    target_directory_str = select_directory(title="Select Parent Folder to List Subfolder Sizes")
+def confirm_action(title: str, message: str, icon: str = 'question', gui: bool = True, assume_yes: bool = False) -> bool | None:
+    """Asks the user to confirm a destructive action.
+       Uses a Tk dialog in the interactive menu and a terminal prompt on the
+       command line. assume_yes (--yes) skips the question entirely.
+       Returns None when there is no terminal to ask on, so callers can
+       report that as a failure rather than as the user declining.
+    """
+    if assume_yes:
+        return True
+    if gui:
+        import tkinter as tk
+        from tkinter import messagebox
+
+        root_confirm = tk.Tk(); root_confirm.withdraw(); root_confirm.attributes('-topmost', True)
+        try:
+            return messagebox.askyesno(title, message, icon=icon)
+        finally:
+            root_confirm.destroy()
+    if not sys.stdin.isatty():
+        console.print("[bold red]Error:[/bold red] Cannot ask for confirmation: no terminal. Pass --yes to proceed without a prompt.")
+        return None
+    console.print(message)
+    return ui.Confirm.ask(f"[bold]{title}?[/]", console=ui.get_console(), default=False)
+
+def load_size_tree(directory: Path, description: str = "Calculating", reuse: bool = True,
+                   max_age: float | None = None):
+    """Returns (tree, node_index) for directory, reusing a tree scanned
+       earlier in this session when one covers it (unless reuse is False,
+       or the tree is older than max_age seconds) and scanning it otherwise.
+    """
+    tree, index = find_session_tree(directory) if reuse else (None, None)
+    if tree is not None and max_age is not None and time.time() - tree.scanned_at > max_age:
+        scanned_at = time.strftime("%H:%M:%S", time.localtime(tree.scanned_at))
+        console.print(f"[dim]Sizes scanned at {scanned_at} are too old to rename from; scanning again.[/]")
+        tree = None
+    if tree is not None:
+        scanned_at = time.strftime("%H:%M:%S", time.localtime(tree.scanned_at))
+        console.print(f"[dim]Reusing sizes scanned at {scanned_at} this session (no disk access).[/]")
+        return tree, index
+
+    with ui.Progress(
+        ui.SpinnerColumn(),
+        ui.TextColumn("[progress.description]{task.description}"),
+        ui.TextColumn("[green]{task.fields[counters]}"),
+        ui.TextColumn("[dim]{task.fields[folders]}[/]"),
+        ui.TimeElapsedColumn(),
+        console=ui.get_console(),
+        transient=True
+    ) as progress:
+        scan_task = progress.add_task(f"[cyan]{description}...", total=None, counters="", folders="")
+        folders_done = 0
+
+        def subfolder_done(totals, subfolder_count):
+            nonlocal folders_done
+            folders_done += 1
+            progress.update(scan_task, description=f"[cyan]{description}: [yellow]{totals.name}[/]",
+                            folders=f"{folders_done}/{subfolder_count} folders done")
+
+        def show_counters(stats):
+            progress.update(scan_task, counters=stats.describe())
+
+        stats = ScanStats(on_progress=show_counters)
+        top = TopEntries(scan_settings["top"]) if scan_settings["top"] else None
+        tree = scan_size_tree(directory, on_subfolder_done=subfolder_done, top=top, stats=stats)
+
+    console.print(f"[dim]{stats.summary()}[/]")
+    session_trees[str(directory)] = tree
+    return tree, 0
+
+def print_top_entries(tree: SizeTree, index: int):
+    """Prints the largest files and directories collected while scanning
+       tree, limited to those inside node index.
+    """
+    if tree.top is None:
+        return
+    base = tree.path_of(index)
+    under = str(base) if index != 0 else None
+    note = "" if index == 0 else f" [dim](from the scan of {tree.root_path})[/]"
+    for title, entries in (("Largest Files", tree.top.largest_files(under)),
+                           ("Largest Directories", tree.top.largest_dirs(under))):
+        if not entries:
+            continue
+        table = ui.Table(title=f"{title} in [cyan]{base.name}[/]{note}", show_header=True, header_style="bold magenta", expand=True)
+        table.add_column("Size", justify="right", style="green", no_wrap=True, width=12)
+        table.add_column("Path", style="dim cyan", no_wrap=False)
+        for size, path in entries:
+            table.add_row(format_size(size), ui.Text(os.path.relpath(path, base), overflow="fold"))
+        console.print(table)
+
+def list_folders_with_sizes(target_directory_str: str | None = None) -> bool:
+    """Action 1: List subfolders with sizes using Rich.
+       Prompts for the directory with a dialog unless one is given.
+       Returns False if the listing could not be produced.
+    """
+    console.print(ui.Rule("[bold cyan]List Subfolder Sizes[/]"))
+    if target_directory_str is None:
+        target_directory_str = select_directory(title="Select Parent Folder to List Subfolder Sizes")
 
     if not target_directory_str:
         console.print("[yellow]No directory selected. Returning to menu.[/]")
-        return
+        return False
 
     target_directory = Path(target_directory_str).resolve()
 
     if not target_directory.is_dir():
         console.print(f"[bold red]Error:[/bold red] Selected path is not a valid directory: [cyan]{target_directory}[/]")
-        return
+        return False
 
     console.print(f"Scanning directory: [cyan]{target_directory}[/]\n")
 
-    folders_to_scan = []
     total_skipped_in_scan = 0
     try:
-        with console.status("[bold green]Finding subdirectories..."):
-            for item in target_directory.iterdir():
-                if item.is_dir():
-                    folders_to_scan.append({"name": item.name, "path": item})
+        tree, parent_index = load_size_tree(target_directory)
+        subfolders = tree.sorted_children(parent_index, by="name")
 
-        if not folders_to_scan:
+        if not subfolders:
             console.print("[yellow]No subfolders found in this directory.[/]")
-            return
+            return True
 
-        console.print(f"Found {len(folders_to_scan)} subfolders. Calculating sizes...")
+        console.print(f"Found {len(subfolders)} subfolders.")
 
         results_data = []
-
-        with Progress(
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-            TimeRemainingColumn(),
-            TimeElapsedColumn(),
-            console=console,
-            transient=True
-        ) as progress:
-            scan_task = progress.add_task("[cyan]Calculating...", total=len(folders_to_scan))
-
-            for folder_info in sorted(folders_to_scan, key=lambda x: x['name'].lower()):
-                folder_name = folder_info['name']
-                folder_path = folder_info['path']
-                progress.update(scan_task, description=f"[cyan]Calculating: [yellow]{folder_name}[/]")
-
-                current_folder_skipped = 0
-                error_msg = None
-                formatted_size = "[grey50]N/A[/]"
-
-                try:
-                    size_bytes, skipped = get_folder_size(folder_path)
-                    current_folder_skipped = skipped
-                    total_skipped_in_scan += current_folder_skipped
-                    formatted_size = format_size(size_bytes)
-                except Exception as e:
-                    error_msg = str(e)
-                    console.print(f"\n[[bold red]Error[/]] calculating size for [yellow]{folder_name}[/]: {e}")
-
-                results_data.append({
-                    "name": folder_name,
-                    "path": folder_path,
-                    "size_str": formatted_size,
-                    "skipped": current_folder_skipped,
-                    "error": error_msg
-                })
-                progress.update(scan_task, advance=1)
-
-        console.print(Rule("[bold cyan]Results[/]"))
-        table = Table(title=f"Subfolders in [cyan]{target_directory.name}[/]", show_header=True, header_style="bold magenta", expand=True)
+        for index in subfolders:
+            skipped = tree.skipped_totals[index]
+            total_skipped_in_scan += skipped
+            results_data.append({
+                "name": tree.name(index),
+                "path": target_directory / tree.name(index),
+                "size_str": format_size(tree.sizes[index]),
+                "skipped": skipped,
+            })
+
+        console.print(ui.Rule("[bold cyan]Results[/]"))
+        table = ui.Table(title=f"Subfolders in [cyan]{target_directory.name}[/]", show_header=True, header_style="bold magenta", expand=True)
         table.add_column("Folder Name", style="dim cyan", width=40, no_wrap=False)
-        table.add_column("Calculated Size", justify="right", style="green")
+        size_header = "Calculated Size" if scan_settings["accounting"] == "apparent" else f"Size ({scan_settings['accounting']})"
+        table.add_column(size_header, justify="right", style="green")
         table.add_column("Status", justify="left")
 
         for item in results_data:
             status = ""
-            if item['error']:
-                status = f"[bold red]Error: {item['error']}[/]"
-            elif item['skipped'] > 0:
+            if item['skipped'] > 0:
                 status = f"[yellow]{item['skipped']} item(s) skipped[/]"
             else:
                  status = "[grey50]OK[/]"
 
-            folder_name_text = Text(item['name'], overflow="fold")
+            folder_name_text = ui.Text(item['name'], overflow="fold")
 
             table.add_row(folder_name_text, item['size_str'], status)
 
         console.print(table)
+        print_top_entries(tree, parent_index)
 
         if total_skipped_in_scan > 0:
             console.print(f"\n[yellow]Note:[/yellow] A total of {total_skipped_in_scan} item(s) could not be accessed across all folders (permissions?).")
         console.print("Listing complete.")
+        return True
 
     except PermissionError:
         console.print(f"\n[bold red]Error:[/bold red] Permission denied to read directory: [cyan]{target_directory}[/]")
     except Exception as e:
         console.print(f"\n[bold red]An unexpected error occurred during listing:[/bold red] {e}")
+    return False
+
 
+OUTPUT_FORMATS = ("table", "jsonl", "csv")
+CSV_FIELDS = ("path", "name", "size_bytes", "accounting", "items_skipped", "error_count", "errors")
 
-def rename_folders_with_size():
-    """Action 2: Rename multiple subfolders with size using Rich."""
-    console.print(Rule("[bold orange_red1]Rename Multiple Subfolders with Size[/]"))
+def stream_folder_sizes(target_directory_str: str, stream, csv_writer=None) -> bool:
+    """Writes one JSON Lines record per subfolder of the directory to
+       stream, or a CSV row to csv_writer if one is given, as soon as that
+       subfolder's size is known. Records hold raw byte and skipped counts
+       plus error messages. Nothing is kept after a record is written, so
+       memory does not grow with the number of subfolders.
+       Returns False if the directory could not be scanned.
+    """
+    import json
+
+    target_directory = Path(target_directory_str).resolve()
+    if not target_directory.is_dir():
+        console.print(f"[bold red]Error:[/bold red] Not a valid directory: [cyan]{target_directory}[/]")
+        return False
+
+    def write_record(totals, subfolder_count):
+        record = {
+            "path": str(target_directory / totals.name),
+            "name": totals.name,
+            "size_bytes": totals.size,
+            "accounting": scan_settings["accounting"],
+            "items_skipped": totals.skipped,
+            "error_count": totals.error_count,
+            "errors": totals.errors,
+        }
+        if csv_writer is not None:
+            record["errors"] = "; ".join(totals.errors)
+            csv_writer.writerow([record[field] for field in CSV_FIELDS])
+        else:
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        stream.flush()
+
+    stats = ScanStats()
+    error = scan_subfolders(target_directory, write_record, stats=stats)
+    console.print(f"[dim]{target_directory}: {stats.summary()}[/]")
+    return error is None
+
+WATCH_REFRESH_SECONDS = 1.0
+# The polling watcher keeps re-reading a directory for this long after it
+# last changed, to see files that are still being written.
+WATCH_POLL_HOT_SECONDS = 60.0
+# inotify instances used by one watch. Subfolders are spread over them so
+# that an overflowing event queue only costs a rescan of its subfolders.
+WATCH_MAX_INOTIFY_QUEUES = 16
+
+_inotify = None
+
+def _load_inotify():
+    """Returns (inotify_init1, inotify_add_watch, inotify_rm_watch) from
+       libc, or False where inotify is not available.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import ctypes
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return False
+    if not hasattr(libc, "inotify_init1"):
+        return False
+    init1, add_watch, rm_watch = libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    init1.argtypes = (ctypes.c_int,)
+    add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+    init1.restype = add_watch.restype = rm_watch.restype = ctypes.c_int
+    return init1, add_watch, rm_watch
+
+class InotifyWatcher:
+    """Directory watches on one inotify instance. read() drains the
+       instance's event queue and returns the watched directories whose
+       entries were created, written, deleted or moved. Directories whose
+       watch ended because they were deleted or moved away are added to
+       removed; overflowed is set when the kernel dropped events because
+       the queue was full.
+    """
+
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x1000000
+    IN_DONT_FOLLOW = 0x2000000
+    IN_EXCL_UNLINK = 0x4000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+    WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                  | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+    def __init__(self):
+        import ctypes
+        import errno
+
+        global _inotify
+        if _inotify is None:
+            _inotify = _load_inotify()
+        if not _inotify:
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        init1, self._add_watch, self._rm_watch = _inotify
+        self.fd = init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.overflowed = False
+        self.removed = set()
+        self._paths = {}
+        self._wds = {}
+
+    def __len__(self):
+        return len(self._wds)
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add(self, path: str):
+        """Watches the entries of directory path. Raises OSError, e.g.
+           ENOSPC past the system's limit on watches.
+        """
+        import ctypes
+
+        wd = self._add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self._paths[wd] = path
+        self._wds[path] = wd
+
+    def discard(self, path: str):
+        wd = self._wds.pop(path, None)
+        if wd is not None:
+            del self._paths[wd]
+            self._rm_watch(self.fd, wd)
+
+    def read(self) -> set[str]:
+        import struct
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = struct.unpack_from("iIII", data, offset)
+                offset += 16 + length
+                if mask & self.IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                path = self._paths.get(wd)
+                if path is None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    # The directory is gone or was unmounted; its parent
+                    # reports the removal.
+                    del self._paths[wd]
+                    del self._wds[path]
+                if mask & (self.IN_IGNORED | self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                    self.removed.add(path)
+                changed.add(path)
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Fallback for platforms without inotify and for directories past the
+       inotify watch limit: read() stats every watched directory and
+       returns those whose modification time changed. Writing to an
+       existing file does not touch its directory, so a changed directory
+       stays "hot" and is returned on every read for WATCH_POLL_HOT_SECONDS.
+    """
+
+    overflowed = False
+
+    def __init__(self):
+        self._mtimes = {}
+        self._hot = {}
+
+    def __len__(self):
+        return len(self._mtimes)
+
+    @staticmethod
+    def _mtime(path: str):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def add(self, path: str):
+        self._mtimes[path] = self._mtime(path)
+
+    def discard(self, path: str):
+        self._mtimes.pop(path, None)
+        self._hot.pop(path, None)
+
+    def read(self) -> set[str]:
+        now = time.monotonic()
+        for path, mtime in self._mtimes.items():
+            current = self._mtime(path)
+            if current != mtime:
+                self._mtimes[path] = current
+                self._hot[path] = now
+        for path, changed_at in list(self._hot.items()):
+            if now - changed_at > WATCH_POLL_HOT_SECONDS:
+                del self._hot[path]
+        return set(self._hot)
+
+    def close(self):
+        pass
+
+class FolderWatch:
+    """Keeps the totals of the immediate subfolders of a scanned folder
+       current from change notifications instead of rescanning it.
+
+       Starting from a finished SizeTree, the own bytes, file count and
+       skipped items of every directory below the folder are kept by path.
+       When a directory changes, only that directory is listed again; the
+       difference to its previous own totals is added to the subfolder it
+       belongs to, new subdirectories are scanned and watched, and vanished
+       ones are subtracted. Directories are watched with inotify, one
+       instance per subfolder up to WATCH_MAX_INOTIFY_QUEUES, so when a
+       queue overflows only the subfolders sharing it are rescanned. Where
+       inotify is missing or out of watches, directories are polled.
+       Directories modified since the scan started are listed once more
+       after their watches are in place, so entries created while the
+       scan ran are not missed.
+    """
+
+    def __init__(self, tree: SizeTree, index: int = 0):
+        import functools
+
+        self.root = str(tree.path_of(index))
+        self._prefix = self.root if self.root.endswith(os.sep) else self.root + os.sep
+        backend_name = scan_settings["backend"]
+        backend = SCAN_BACKENDS[default_scan_backend() if backend_name == "auto" else backend_name]
+        self.lister = functools.partial(backend, accounting=scan_settings["accounting"])
+        if scan_settings["filter"] is not None:
+            self.lister = functools.partial(self.lister, scan_filter=scan_settings["filter"].for_root(self.root))
+        self.own = {}
+        self.subdirs = {}
+        self.totals = {}
+        self.initial_sizes = {}
+        self.watchers = {}
+        self.queues = []
+        self.queue_of = {}
+        self.poller = PollingWatcher()
+        self.rescans = 0
+        self.root_lost = False
+        self.modified = False
+        self._inotify_failed = False
+        self._changed = set()
+        self._removed = set()
+        self._recheck = set()
+
+        starts, nodes = tree.child_index()
+        names = tree.name_table.as_list()
+        pending = [(index, self.root)]
+        while pending:
+            node, path = pending.pop()
+            self._track(path)
+            self._set_own(path, tree.file_bytes[node], tree.file_counts[node], tree.skipped[node])
+            for child in nodes[starts[node]:starts[node + 1]]:
+                child_path = os.path.join(path, names[tree.name_ids[child]])
+                self.subdirs[path].add(child_path)
+                pending.append((child, child_path))
+        self.initial_sizes = {name: totals[0] for name, totals in self.totals.items()}
+        # Allow for file systems with coarse timestamps.
+        scan_started_ns = int(tree.scanned_at * 1e9) - SizeCache.RACY_WINDOW_NS
+        for path in self.own:
+            try:
+                if os.stat(path, follow_symlinks=False).st_mtime_ns >= scan_started_ns:
+                    self._recheck.add(path)
+            except OSError:
+                self._recheck.add(path)
+
+    def subfolder_of(self, path: str) -> str | None:
+        """Name of the immediate subfolder path lies in, None for the root."""
+        if path == self.root:
+            return None
+        return path[len(self._prefix):].split(os.sep, 1)[0]
+
+    def _queue_for(self, subfolder: str | None):
+        if subfolder in self.queue_of:
+            return self.queue_of[subfolder]
+        watcher = None
+        if not self._inotify_failed and len(self.queues) < WATCH_MAX_INOTIFY_QUEUES:
+            try:
+                watcher = InotifyWatcher()
+                self.queues.append(watcher)
+            except OSError:
+                self._inotify_failed = True
+        if watcher is None and self.queues:
+            watcher = self.queues[len(self.queue_of) % len(self.queues)]
+        self.queue_of[subfolder] = watcher
+        return watcher
+
+    def _track(self, path: str):
+        """Starts watching a directory, before it is listed, so changes
+           made while it is being listed are not missed.
+        """
+        subfolder = self.subfolder_of(path)
+        self.own[path] = [0, 0, 0]
+        self.subdirs[path] = set()
+        if subfolder is not None and subfolder not in self.totals:
+            self.totals[subfolder] = [0, 0, 0]
+        watcher = self._queue_for(subfolder)
+        if watcher is not None:
+            try:
+                watcher.add(path)
+                self.watchers[path] = watcher
+                return
+            except OSError:
+                pass
+        self.poller.add(path)
+        self.watchers[path] = self.poller
+
+    def _set_own(self, path: str, file_bytes: int, file_count: int, skipped: int):
+        own = self.own[path]
+        if own == [file_bytes, file_count, skipped]:
+            return
+        self.modified = True
+        subfolder = self.subfolder_of(path)
+        if subfolder is not None:
+            totals = self.totals[subfolder]
+            totals[0] += file_bytes - own[0]
+            totals[1] += file_count - own[1]
+            totals[2] += skipped - own[2]
+        own[:] = file_bytes, file_count, skipped
+
+    def _untrack(self, path: str):
+        """Stops watching a directory and everything below it and subtracts
+           their totals.
+        """
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            self._set_own(current, 0, 0, 0)
+            del self.own[current]
+            pending.extend(self.subdirs.pop(current))
+            self.watchers.pop(current).discard(current)
+        if os.path.dirname(path) == self.root:
+            name = self.subfolder_of(path)
+            self.totals.pop(name, None)
+            self.queue_of.pop(name, None)
+            self.modified = True
+
+    def _scan_subtree(self, path: str):
+        pending = [path]
+        while pending:
+            current = pending.pop()
+            if current in self.own:
+                continue
+            self._track(current)
+            file_bytes, file_count, skipped, subdirs, _error = self.lister(current)
+            self._set_own(current, file_bytes, file_count, skipped)
+            self.subdirs[current].update(subdirs)
+            pending.extend(subdirs)
+            # Entries created between listing the parent and watching this
+            # directory raised no event; list it once more next time.
+            self._recheck.add(current)
+
+    def refresh(self, path: str):
+        """Lists one changed directory again and applies the difference."""
+        if path not in self.own:
+            return
+        file_bytes, file_count, skipped, subdirs, error = self.lister(path)
+        if error is not None and not os.path.isdir(path):
+            if path == self.root:
+                self.root_lost = True
+                return
+            self._untrack(path)
+            self.subdirs[os.path.dirname(path)].discard(path)
+            return
+        self._set_own(path, file_bytes, file_count, skipped)
+        current = set(subdirs)
+        known = self.subdirs[path]
+        for gone in known - current:
+            self._untrack(gone)
+        for new in current - known:
+            self._scan_subtree(new)
+        self.subdirs[path] = current
+
+    def wait(self, timeout: float):
+        """Sleeps up to timeout seconds, waking early when events arrive,
+           and collects them.
+        """
+        import select
+
+        if self.queues:
+            select.select(self.queues, [], [], max(0.0, timeout))
+        else:
+            time.sleep(max(0.0, timeout))
+        for watcher in self.queues:
+            self._changed |= watcher.read()
+            self._removed |= watcher.removed
+            watcher.removed.clear()
+
+    def apply_changes(self) -> bool:
+        """Applies everything collected since the last call. Returns True
+           if any subfolder's totals changed.
+        """
+        changed, self._changed = self._changed | self._recheck, set()
+        self._recheck = set()
+        removed, self._removed = self._removed, set()
+        if self.root in removed:
+            # Even if a folder of that name comes back, it is a new one.
+            self.root_lost = True
+            return False
+        # A watched directory that was deleted (or moved away) and replaced
+        # by a new one of the same name would look unchanged to its parent;
+        # drop it so the parent's listing scans and watches it afresh.
+        for path in sorted(removed, key=len):
+            if path in self.own:
+                parent = os.path.dirname(path)
+                self._untrack(path)
+                self.subdirs[parent].discard(path)
+                changed.add(parent)
+        if len(self.poller):
+            changed |= self.poller.read()
+        for watcher in self.queues:
+            if watcher.overflowed:
+                watcher.overflowed = False
+                self.rescans += 1
+                for name in [name for name, owner in self.queue_of.items() if owner is watcher and name is not None]:
+                    path = os.path.join(self.root, name)
+                    if path in self.own:
+                        self._untrack(path)
+                        self.subdirs[self.root].discard(path)
+                changed.add(self.root)
+        # Parents first, so a vanished subtree is dropped before any of its
+        # directories would be listed.
+        self.modified = False
+        for path in sorted(changed, key=len):
+            self.refresh(path)
+        return self.modified
+
+    def describe(self) -> str:
+        watched = len(self.watchers) - len(self.poller)
+        polled = f", {len(self.poller):,} polled" if len(self.poller) else ""
+        return f"{watched:,} directories watched{polled}"
+
+    def close(self):
+        for watcher in self.queues:
+            watcher.close()
+        self.queues = []
+
+def _watch_table(watch: FolderWatch, target_directory: Path):
+    table = ui.Table(title=f"Subfolders in [cyan]{target_directory.name}[/] [dim](live)[/]", show_header=True,
+                     header_style="bold magenta", expand=True,
+                     caption=f"Updated {time.strftime('%H:%M:%S')}: {watch.describe()}, {watch.rescans} rescan(s) after lost events")
+    table.add_column("Folder Name", style="dim cyan", width=40, no_wrap=False)
+    size_header = "Calculated Size" if scan_settings["accounting"] == "apparent" else f"Size ({scan_settings['accounting']})"
+    table.add_column(size_header, justify="right", style="green")
+    table.add_column("Since Start", justify="right")
+    table.add_column("Status", justify="left")
+    for name in sorted(watch.totals, key=str.lower):
+        size, _files, skipped = watch.totals[name]
+        change = size - watch.initial_sizes.get(name, 0)
+        if name not in watch.initial_sizes:
+            change_text = "[bold cyan]new[/]"
+        elif change:
+            change_text = f"[{'yellow' if change > 0 else 'blue'}]{'+' if change > 0 else '-'}{format_size(abs(change))}[/]"
+        else:
+            change_text = ""
+        status = f"[yellow]{skipped} item(s) skipped[/]" if skipped else "[grey50]OK[/]"
+        table.add_row(ui.Text(name, overflow="fold"), format_size(size), change_text, status)
+    return table
+
+def watch_folder_sizes(target_directory_str: str, interval: float = WATCH_REFRESH_SECONDS) -> bool:
+    """list --watch: scans the directory once, then keeps its subfolder
+       table live from file system events, redrawing it at most once per
+       interval seconds, until interrupted with Ctrl+C.
+       Returns False if the directory could not be scanned or went away.
+    """
+    console.print(ui.Rule("[bold cyan]Watch Subfolder Sizes[/]"))
+    target_directory = Path(target_directory_str).resolve()
+    if not target_directory.is_dir():
+        console.print(f"[bold red]Error:[/bold red] Selected path is not a valid directory: [cyan]{target_directory}[/]")
+        return False
+
+    console.print(f"Scanning directory: [cyan]{target_directory}[/]\n")
+    tree, index = load_size_tree(target_directory)
+    watch = FolderWatch(tree, index)
+    console.print(f"[dim]{watch.describe()}. Press Ctrl+C to stop.[/]")
+    try:
+        with ui.Live(_watch_table(watch, target_directory), console=ui.get_console(), auto_refresh=False) as live:
+            next_refresh = time.monotonic() + interval
+            while not watch.root_lost:
+                watch.wait(next_refresh - time.monotonic())
+                if time.monotonic() < next_refresh:
+                    continue
+                if watch.apply_changes():
+                    live.update(_watch_table(watch, target_directory), refresh=True)
+                next_refresh = time.monotonic() + interval
+    except KeyboardInterrupt:
+        console.print("Stopped watching.")
+        return True
+    finally:
+        watch.close()
+    console.print(f"[bold red]Error:[/bold red] [cyan]{target_directory}[/] was removed or moved; stopped watching.")
+    return False
+
+_native_rename_noreplace = None
+
+def _load_native_rename_noreplace():
+    """Returns f(src_bytes, dst_bytes) -> 0 or -1 (errno set) calling the
+       platform's atomic no-replace rename, or False where there is none.
+    """
+    import ctypes
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return False
+    if sys.platform.startswith("linux") and hasattr(libc, "renameat2"):
+        at_fdcwd, rename_noreplace_flag = -100, 1
+        renameat2 = libc.renameat2
+        renameat2.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+        renameat2.restype = ctypes.c_int
+        return lambda src, dst: renameat2(at_fdcwd, src, at_fdcwd, dst, rename_noreplace_flag)
+    if sys.platform == "darwin" and hasattr(libc, "renamex_np"):
+        rename_excl = 0x4
+        renamex_np = libc.renamex_np
+        renamex_np.argtypes = (ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint)
+        renamex_np.restype = ctypes.c_int
+        return lambda src, dst: renamex_np(src, dst, rename_excl)
+    return False
+
+def rename_noreplace(src, dst):
+    """Renames src to dst, raising FileExistsError instead of replacing dst.
+       The check and the rename are one atomic step on Linux (renameat2
+       with RENAME_NOREPLACE), macOS (renamex_np with RENAME_EXCL) and
+       Windows (os.rename never replaces). Elsewhere, and on file systems
+       that do not support the flag, dst is checked first, which leaves a
+       small window for a race.
+    """
+    import errno
+
+    global _native_rename_noreplace
+    if sys.platform != "win32":
+        if _native_rename_noreplace is None:
+            _native_rename_noreplace = _load_native_rename_noreplace()
+        if _native_rename_noreplace:
+            import ctypes
+
+            if _native_rename_noreplace(os.fsencode(src), os.fsencode(dst)) == 0:
+                return
+            err = ctypes.get_errno()
+            if err not in (errno.EINVAL, errno.ENOSYS, errno.ENOTSUP):
+                raise OSError(err, os.strerror(err), os.fspath(src), None, os.fspath(dst))
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), os.fspath(src), None, os.fspath(dst))
+    os.rename(src, dst)
+
+class RenameJournal:
+    """Append-only JSON Lines record of one batch of renames inside a
+       directory. Every planned rename is written and fsynced before the
+       first one runs, and each outcome is appended as it happens, so an
+       interrupted run can be resumed and a finished one undone. Outcome
+       lines are only flushed, not fsynced: after a crash, resuming checks
+       the disk for renames that happened but were not recorded.
+    """
+
+    def __init__(self, path: Path, records: list[dict]):
+        self.path = Path(path)
+        self.records = records
+        self._lock = threading.Lock()
+        self._file = None
+
+    # Finished journals beyond this many of the newest are deleted when a
+    # new run starts, so looking for an unfinished run stays cheap.
+    KEEP_FINISHED = 50
+
+    @staticmethod
+    def default_dir() -> Path:
+        return user_config_dir() / "rename_journals"
+
+    @classmethod
+    def _paths_newest_first(cls) -> list[Path]:
+        return sorted(cls.default_dir().glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True)
+
+    @classmethod
+    def prune(cls):
+        """Deletes finished journals older than the KEEP_FINISHED newest.
+           Unfinished runs are kept until they are resumed or undone.
+        """
+        try:
+            paths = cls._paths_newest_first()
+        except OSError:
+            return
+        for path in paths[cls.KEEP_FINISHED:]:
+            try:
+                if cls.load(path).finished:
+                    path.unlink()
+            except (OSError, ValueError):
+                continue
+
+    @classmethod
+    def create(cls, directory: Path, renames: list[tuple[str, str]]) -> "RenameJournal":
+        """Writes a new journal planning renames [(old_name, new_name)] in directory."""
+        journal_dir = cls.default_dir()
+        journal_dir.mkdir(parents=True, exist_ok=True)
+        cls.prune()
+        stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        attempt = 0
+        while True:
+            path = journal_dir / (f"{stem}.jsonl" if not attempt else f"{stem}-{attempt}.jsonl")
+            try:
+                journal_file = open(path, "x", encoding="utf-8")
+                break
+            except FileExistsError:
+                attempt += 1
+        journal = cls(path, [])
+        journal._file = journal_file
+        journal._append({"op": "begin", "directory": os.fspath(directory), "time": time.time()}, sync=False)
+        for old, new in renames:
+            journal._append({"op": "plan", "old": old, "new": new}, sync=False)
+        journal._sync()
+        return journal
+
+    @classmethod
+    def load(cls, path) -> "RenameJournal":
+        """Reads a journal; a truncated last line from a crash is ignored.
+           Raises ValueError if path is not a rename journal.
+        """
+        import json
+
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        if not records or records[0].get("op") != "begin":
+            raise ValueError(f"{path} is not a rename journal")
+        return cls(path, records)
+
+    @classmethod
+    def latest(cls, unfinished: bool = False) -> "RenameJournal | None":
+        """Returns the most recent journal (only runs that did not finish,
+           if unfinished is set), or None.
+        """
+        try:
+            paths = cls._paths_newest_first()
+        except OSError:
+            return None
+        for path in paths:
+            try:
+                journal = cls.load(path)
+            except (OSError, ValueError):
+                continue
+            if not unfinished or not journal.finished:
+                return journal
+        return None
+
+    @property
+    def directory(self) -> Path:
+        return Path(self.records[0]["directory"])
+
+    @property
+    def finished(self) -> bool:
+        """True once the run completed or was undone; resume skips it then."""
+        return any(record["op"] in ("end", "undo_end") for record in self.records)
+
+    def _outcomes(self, ops):
+        return {(record["old"], record["new"]) for record in self.records if record["op"] in ops}
+
+    def pending(self) -> list[tuple[str, str]]:
+        """Planned renames that have neither succeeded nor failed yet."""
+        settled = self._outcomes(("done", "failed"))
+        return [(r["old"], r["new"]) for r in self.records if r["op"] == "plan" and (r["old"], r["new"]) not in settled]
+
+    def completed(self) -> list[tuple[str, str]]:
+        """Renames that succeeded and have not been undone, in the order they ran."""
+        undone = self._outcomes(("undone",))
+        return [(r["old"], r["new"]) for r in self.records if r["op"] == "done" and (r["old"], r["new"]) not in undone]
+
+    def record(self, op: str, old: str, new: str, error: str | None = None):
+        entry = {"op": op, "old": old, "new": new}
+        if error is not None:
+            entry["error"] = error
+        self._append(entry, sync=False)
+
+    def finish(self, op: str = "end"):
+        self._append({"op": op, "time": time.time()}, sync=True)
+
+    def _append(self, entry: dict, sync: bool):
+        import json
+
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(entry) + "\n")
+            self.records.append(entry)
+            if sync:
+                self._sync_locked()
+            else:
+                self._file.flush()
+
+    def _sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def execute_renames(journal: RenameJournal, renames: list[tuple[str, str]], undo: bool = False,
+                    workers: int | None = None) -> tuple[int, int]:
+    """Runs renames [(old_name, new_name)] inside journal.directory on a
+       thread pool, recording each outcome in the journal; with undo, each
+       new_name is renamed back to old_name. Renames never replace an
+       existing entry. Returns (succeeded, failed).
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    if workers is None:
+        workers = scan_settings["workers"]
+    directory = journal.directory
+    succeeded = failed = 0
+    if not renames:
+        return succeeded, failed
+
+    def rename(old, new):
+        source, target = (directory / new, directory / old) if undo else (directory / old, directory / new)
+        rename_noreplace(source, target)
+        return source, target
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(renames)))) as pool:
+        futures = {pool.submit(rename, old, new): (old, new) for old, new in renames}
+        for future in as_completed(futures):
+            old, new = futures[future]
+            from_name, to_name = (new, old) if undo else (old, new)
+            try:
+                source, target = future.result()
+            except FileExistsError:
+                console.print(f"   -> [bold red]Error:[/bold red] Cannot rename '[cyan]{from_name}[/]'. Target '[cyan]{to_name}[/]' already exists. Skipping.")
+                journal.record("undo_failed" if undo else "failed", old, new, "target exists")
+                failed += 1
+            except OSError as e:
+                console.print(f"   -> [bold red]Error[/] renaming '[cyan]{from_name}[/]' to '[cyan]{to_name}[/]': {e}")
+                journal.record("undo_failed" if undo else "failed", old, new, str(e))
+                failed += 1
+            else:
+                journal.record("undone" if undo else "done", old, new)
+                note_session_rename(source, target)
+                console.print(f"   -> [green]Renamed:[/green] '[cyan]{from_name}[/]' -> '[bold green]{to_name}[/]'")
+                succeeded += 1
+    return succeeded, failed
+
+def _settle_interrupted(journal: RenameJournal, renames: list[tuple[str, str]], undo: bool) -> list[tuple[str, str]]:
+    """Records renames from an interrupted run that reached the disk but not
+       the journal, and returns the ones still to do.
+    """
+    directory = journal.directory
+    remaining = []
+    for old, new in renames:
+        source, target = (new, old) if undo else (old, new)
+        if not os.path.lexists(directory / source) and os.path.lexists(directory / target):
+            journal.record("undone" if undo else "done", old, new)
+        else:
+            remaining.append((old, new))
+    return remaining
+
+def _open_journal(journal_path: str | None, unfinished: bool) -> RenameJournal | None:
+    try:
+        journal = RenameJournal.load(journal_path) if journal_path else RenameJournal.latest(unfinished=unfinished)
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Error:[/bold red] Cannot read rename journal [cyan]{journal_path}[/]: {e}")
+        return None
+    if journal is None:
+        console.print(f"[yellow]No {'interrupted ' if unfinished else ''}rename runs found in [cyan]{RenameJournal.default_dir()}[/].[/]")
+    return journal
+
+def resume_renames(journal_path: str | None = None, assume_yes: bool = False) -> bool:
+    """Finishes a rename run that was interrupted, using the names planned
+       in its journal (the most recent unfinished one by default).
+       Returns False on errors or failed renames.
+    """
+    console.print(ui.Rule("[bold orange_red1]Resume Interrupted Renames[/]"))
+    journal = _open_journal(journal_path, unfinished=True)
+    if journal is None:
+        return journal_path is None
+    try:
+        remaining = _settle_interrupted(journal, journal.pending(), undo=False)
+        console.print(f"Journal [cyan]{journal.path}[/] for [cyan]{journal.directory}[/]: {len(remaining)} rename(s) left.")
+        if remaining:
+            confirm = confirm_action("Confirm Rename", f"Finish {len(remaining)} rename(s) in {journal.directory}?",
+                                     icon='warning', gui=False, assume_yes=assume_yes)
+            if confirm is None:
+                return False
+            if not confirm:
+                console.print("[yellow]Rename operation cancelled by user.[/]")
+                return True
+        succeeded, failed = execute_renames(journal, remaining)
+        journal.finish()
+        console.print(f"Resumed run finished: {succeeded} renamed, {failed} failed.")
+        return failed == 0
+    finally:
+        journal.close()
+
+def undo_renames(journal_path: str | None = None, assume_yes: bool = False) -> bool:
+    """Reverts the renames recorded in a journal (the most recent one by
+       default), one at a time and newest first. Renames of an interrupted
+       run that reached the disk without being recorded are reverted too.
+       Returns False on errors or failed renames.
+    """
+    console.print(ui.Rule("[bold orange_red1]Undo Renames[/]"))
+    journal = _open_journal(journal_path, unfinished=False)
+    if journal is None:
+        return journal_path is None
+    try:
+        _settle_interrupted(journal, journal.pending(), undo=False)
+        completed = journal.completed()
+        completed.reverse()
+        remaining = _settle_interrupted(journal, completed, undo=True)
+        if not remaining:
+            console.print(f"[yellow]Nothing to undo in [cyan]{journal.path}[/].[/]")
+            return True
+        table = ui.Table(title=f"Renames to revert in [cyan]{journal.directory}[/]", show_header=True, header_style="bold magenta", expand=True)
+        table.add_column("Current Name", style="dim cyan", no_wrap=False)
+        table.add_column(" ", justify="center")
+        table.add_column("Restored Name", style="green", no_wrap=False)
+        for old, new in remaining:
+            table.add_row(ui.Text(new, overflow="fold"), "->", ui.Text(old, overflow="fold"))
+        console.print(table)
+        confirm = confirm_action("Confirm Undo", f"Revert {len(remaining)} rename(s) in {journal.directory}?",
+                                 icon='warning', gui=False, assume_yes=assume_yes)
+        if confirm is None:
+            return False
+        if not confirm:
+            console.print("[yellow]Undo cancelled by user.[/]")
+            return True
+        succeeded, failed = execute_renames(journal, remaining, undo=True, workers=1)
+        journal.finish("undo_end")
+        console.print(f"Undo finished: {succeeded} restored, {failed} failed.")
+        return failed == 0
+    finally:
+        journal.close()
+
+def rename_folders_with_size(target_directory_str: str | None = None, assume_yes: bool = False) -> bool:
+    """Action 2: Rename multiple subfolders with size using Rich.
+       Prompts for the directory with a dialog unless one is given, in which
+       case confirmation is asked on the terminal (or skipped by assume_yes).
+       Returns False on errors or failed renames.
+    """
+    console.print(ui.Rule("[bold orange_red1]Rename Multiple Subfolders with Size[/]"))
     console.print("[bold yellow]⚠️ WARNING:[/] This will rename subfolders in the selected directory.")
     console.print("         Ensure you have backups or test on unimportant data first!")
 
-    target_directory_str = select_directory(title="Select Parent Folder Containing Subfolders to Rename")
+    gui = target_directory_str is None
+    if gui:
+        target_directory_str = select_directory(title="Select Parent Folder Containing Subfolders to Rename")
 
     if not target_directory_str:
         console.print("[yellow]No directory selected. Returning to menu.[/]")
-        return
+        return False
 
     target_directory = Path(target_directory_str).resolve()
 
     if not target_directory.is_dir():
         console.print(f"[bold red]Error:[/bold red] Selected path is not a valid directory: [cyan]{target_directory}[/]")
-        return
+        return False
+
+    interrupted = RenameJournal.latest(unfinished=True)
+    if interrupted is not None and interrupted.directory == target_directory:
+        console.print("[yellow]Note:[/yellow] An earlier rename run in this directory was interrupted. Finish it with "
+                      "'DirSizer.py resume' or revert it with 'DirSizer.py undo'.")
 
     console.print(f"Scanning directory for renaming: [cyan]{target_directory}[/]\n")
 
-    folders_to_process = []
     folders_to_rename_info = []
     skipped_already_named = 0
+    skipped_path_too_long = 0
     total_skipped_items_calc = 0
 
     try:
-        with console.status("[bold green]Finding subdirectories..."):
-            for item in target_directory.iterdir():
-                if item.is_dir():
-                    folders_to_process.append({"name": item.name, "path": item})
+        tree, parent_index = load_size_tree(target_directory, description="Calculating sizes for renaming",
+                                            max_age=RENAME_TREE_MAX_AGE)
+        subfolders = tree.sorted_children(parent_index, by="name")
 
-        if not folders_to_process:
+        if not subfolders:
             console.print("[yellow]No subfolders found to rename in this directory.[/]")
-            return
-
-        console.print(f"Found {len(folders_to_process)} subfolders. Calculating sizes for renaming...")
+            return True
 
-        with Progress(
-            TextColumn("[progress.description]{task.description}"), BarColumn(),
-            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-            TimeRemainingColumn(), console=console, transient=True
-        ) as progress:
-            calc_task = progress.add_task("[cyan]Calculating...", total=len(folders_to_process))
+        console.print(f"Found {len(subfolders)} subfolders.")
 
-            for folder_info in sorted(folders_to_process, key=lambda x: x['name'].lower()):
-                folder_name = folder_info['name']
-                old_path = folder_info['path']
-                progress.update(calc_task, description=f"[cyan]Calculating: [yellow]{folder_name}[/]")
+        for index in subfolders:
+            folder_name = tree.name(index)
+            old_path = target_directory / folder_name
 
-                if check_if_already_renamed(folder_name):
-                    console.print(f"   -> [yellow]Skipping:[/yellow] [cyan]'{folder_name}'[/] (looks already renamed)")
-                    skipped_already_named += 1
-                    progress.update(calc_task, advance=1)
-                    continue
-
-                formatted_size = "[grey50]N/A[/]"
-                new_folder_name = None
-                new_path = None
-                current_skipped = 0
-                error_msg = None
-
-                try:
-                    size_bytes, skipped = get_folder_size(old_path)
-                    current_skipped = skipped
-                    total_skipped_items_calc += skipped
-                    formatted_size = format_size(size_bytes)
-                    new_folder_name = f"{folder_name} [{formatted_size}]"
-                    new_path = target_directory / new_folder_name
-
-                    if len(str(new_path)) > 240:
-                         error_msg = "Resulting path too long"
-                         console.print(f"   -> [yellow]Skipping:[/yellow] [cyan]'{folder_name}'[/] ({error_msg})")
-                         progress.update(calc_task, advance=1)
-                         continue
+            if check_if_already_renamed(folder_name):
+                console.print(f"   -> [yellow]Skipping:[/yellow] [cyan]'{folder_name}'[/] (looks already renamed)")
+                skipped_already_named += 1
+                continue
 
-                    folders_to_rename_info.append({
-                        "old_name": folder_name, "old_path": old_path,
-                        "new_name": new_folder_name, "new_path": new_path,
-                        "size_str": formatted_size, "skipped": current_skipped
-                    })
-                    console.print(f"   -> [green]OK:[/green] [cyan]'{folder_name}'[/] -> Size: [bold green]{formatted_size}[/]" + (f" ([yellow]{current_skipped} skipped[/])" if current_skipped else ""))
+            current_skipped = tree.skipped_totals[index]
+            total_skipped_items_calc += current_skipped
+            formatted_size = format_size(tree.sizes[index])
+            new_folder_name = f"{folder_name} [{formatted_size}]"
+            new_path = target_directory / new_folder_name
 
-                except Exception as e:
-                    error_msg = str(e)
-                    console.print(f"\n   -> [[bold red]Error[/]] calculating size for [yellow]{folder_name}[/]: {e}")
+            if len(str(new_path)) > 240:
+                 console.print(f"   -> [yellow]Skipping:[/yellow] [cyan]'{folder_name}'[/] (Resulting path too long)")
+                 skipped_path_too_long += 1
+                 continue
 
-                progress.update(calc_task, advance=1)
+            folders_to_rename_info.append({
+                "old_name": folder_name, "old_path": old_path,
+                "new_name": new_folder_name, "new_path": new_path,
+                "size_str": formatted_size, "skipped": current_skipped
+            })
+            console.print(f"   -> [green]OK:[/green] [cyan]'{folder_name}'[/] -> Size: [bold green]{formatted_size}[/]" + (f" ([yellow]{current_skipped} skipped[/])" if current_skipped else ""))
 
 
         console.print(f"\nCalculation complete. {skipped_already_named} folder(s) skipped as potentially already renamed.")
         if total_skipped_items_calc > 0:
              console.print(f"[yellow]Note:[/yellow] {total_skipped_items_calc} item(s) could not be accessed during size calculation.")
-        print("")
+        console.print("")
 
         if not folders_to_rename_info:
             console.print("[yellow]No folders eligible for renaming found.[/]")
-            return
+            return True
 
-        console.print(Rule("[bold yellow]Proposed Renames[/]"))
-        confirm_table = Table(title="Review Carefully!", show_header=True, header_style="bold magenta", expand=True)
+        console.print(ui.Rule("[bold yellow]Proposed Renames[/]"))
+        confirm_table = ui.Table(title="Review Carefully!", show_header=True, header_style="bold magenta", expand=True)
         confirm_table.add_column("Current Name", style="dim cyan", no_wrap=False)
         confirm_table.add_column(" ", justify="center")
         confirm_table.add_column("Proposed New Name", style="green", no_wrap=False)
@@ -289,53 +2850,43 @@ def rename_folders_with_size():
 
         console.print(confirm_table)
 
-        root_confirm = tk.Tk(); root_confirm.withdraw(); root_confirm.attributes('-topmost', True)
-        confirm = messagebox.askyesno(
+        confirm = confirm_action(
             "Confirm Rename",
             f"Proceed with renaming {len(folders_to_rename_info)} folder(s) in:\n"
             f"{target_directory}\n\n"
-            f"Review the proposed names in the terminal.\nThis action CANNOT be easily undone.",
-            icon='warning' )
-        root_confirm.destroy()
+            f"Review the proposed names in the terminal.\nThe renames are journaled and can be reverted with 'DirSizer.py undo'.",
+            icon='warning', gui=gui, assume_yes=assume_yes)
 
+        if confirm is None:
+            return False
         if not confirm:
             console.print("[yellow]Rename operation cancelled by user.[/]")
-            return
-
-        console.print(Rule("[bold orange_red1]Performing Renames[/]"))
-        success_count = 0
-        fail_count = 0
-        for rename_info in folders_to_rename_info:
-            old = rename_info['old_path']
-            new = rename_info['new_path']
-            old_display = rename_info['old_name']
-            new_display = rename_info['new_name']
-
-            if new.exists():
-                 console.print(f"   -> [bold red]Error:[/bold red] Cannot rename '[cyan]{old_display}[/]'. Target '[cyan]{new_display}[/]' already exists. Skipping.")
-                 fail_count += 1
-                 continue
+            return True
 
-            try:
-                old.rename(new)
-                console.print(f"   -> [green]Renamed:[/green] '[cyan]{old_display}[/]' -> '[bold green]{new_display}[/]'")
-                success_count += 1
-            except OSError as e:
-                console.print(f"   -> [bold red]Error[/] renaming '[cyan]{old_display}[/]' to '[cyan]{new_display}[/]': {e}")
-                fail_count += 1
-            except Exception as e:
-                 console.print(f"   -> [bold red]Unexpected Error[/] renaming '[cyan]{old_display}[/]': {e}")
-                 fail_count += 1
-
-        console.print(Rule("[bold cyan]Rename Summary[/]"))
-        summary_table = Table(show_header=False, box=None, padding=(0,1))
+        console.print(ui.Rule("[bold orange_red1]Performing Renames[/]"))
+        renames = [(info["old_name"], info["new_name"]) for info in folders_to_rename_info]
+        try:
+            journal = RenameJournal.create(target_directory, renames)
+        except OSError as e:
+            console.print(f"[bold red]Error:[/bold red] Cannot write the rename journal, nothing was renamed: {e}")
+            return False
+        try:
+            console.print(f"[dim]Journal: {journal.path} (revert with 'DirSizer.py undo')[/]")
+            success_count, fail_count = execute_renames(journal, renames)
+            journal.finish()
+        finally:
+            journal.close()
+
+        console.print(ui.Rule("[bold cyan]Rename Summary[/]"))
+        summary_table = ui.Table(show_header=False, box=None, padding=(0,1))
         summary_table.add_column()
         summary_table.add_column(justify="right")
         summary_table.add_row("[green]Successfully renamed:[/]", f"[bold green]{success_count}[/]")
-        skipped_total = fail_count + skipped_already_named + len([f for f in folders_to_rename_info if len(str(f['new_path'])) > 240])
+        skipped_total = fail_count + skipped_already_named + skipped_path_too_long
         summary_table.add_row("[yellow]Failed/Skipped:[/]", f"[bold yellow]{skipped_total}[/]")
         console.print(summary_table)
         console.print("Rename operation finished.")
+        return fail_count == 0
 
 
     except PermissionError:
@@ -344,25 +2895,33 @@ def rename_folders_with_size():
          console.print(f"\n[bold red]Error:[/bold red] Directory not found during scan: [cyan]{target_directory}[/]")
     except Exception as e:
         console.print(f"\n[bold red]An unexpected error occurred during renaming process:[/bold red] {e}")
+    return False
 
 
-def analyze_and_rename_single_folder():
-    """Action 3: Analyze & rename a single selected folder using Rich."""
-    console.print(Rule("[bold blue]Analyze & Rename Single Folder[/]"))
-    console.print("Select the specific folder you want to analyze and potentially rename.")
+def analyze_and_rename_single_folder(selected_folder_path_str: str | None = None, assume_yes: bool = False) -> bool:
+    """Action 3: Analyze & rename a single selected folder using Rich.
+       Prompts for the folder with a dialog unless one is given, in which
+       case confirmation is asked on the terminal (or skipped by assume_yes).
+       Returns False on errors.
+    """
+    gui = selected_folder_path_str is None
+    console.print(ui.Rule("[bold blue]Analyze & Rename Single Folder[/]"))
+    if gui:
+        console.print("Select the specific folder you want to analyze and potentially rename.")
     console.print("[bold yellow]⚠️ WARNING:[/] This will rename the selected folder itself.")
 
-    selected_folder_path_str = select_directory(title="Select Folder to Analyze and Rename")
+    if gui:
+        selected_folder_path_str = select_directory(title="Select Folder to Analyze and Rename")
 
     if not selected_folder_path_str:
         console.print("[yellow]No directory selected. Returning to menu.[/]")
-        return
+        return False
 
     selected_folder_path = Path(selected_folder_path_str).resolve()
 
     if not selected_folder_path.is_dir():
         console.print(f"[bold red]Error:[/bold red] Selected path is not a valid directory: [cyan]{selected_folder_path}[/]")
-        return
+        return False
 
     folder_name = selected_folder_path.name
     parent_dir = selected_folder_path.parent
@@ -373,13 +2932,15 @@ def analyze_and_rename_single_folder():
     if check_if_already_renamed(folder_name):
         console.print(f"\n[yellow]Folder '[cyan]{folder_name}[/]' appears to already have a size appended. Skipping rename proposal.[/]")
         try:
-            with console.status("[bold green]Calculating size anyway..."):
-                size_bytes, skipped = get_folder_size(selected_folder_path)
-            formatted_size = format_size(size_bytes)
+            tree, index = load_size_tree(selected_folder_path, description="Calculating size anyway")
+            skipped = tree.skipped_totals[index]
+            formatted_size = format_size(tree.sizes[index])
             console.print(f"\nCalculated size: [bold green]{formatted_size}[/]" + (f" ([yellow]{skipped} items skipped[/])" if skipped else ""))
+            print_top_entries(tree, index)
         except Exception as e:
             console.print(f"\n[bold red]Error calculating size:[/bold red] {e}")
-        return
+            return False
+        return True
 
     total_skipped_items = 0
     formatted_size = "[grey50]N/A[/]"
@@ -387,62 +2948,288 @@ def analyze_and_rename_single_folder():
     new_full_path = None
 
     try:
-        with console.status(f"[bold green]Calculating size for '{folder_name}'...", spinner="dots") as status:
-            start_time = time.time()
-            size_bytes, skipped = get_folder_size(selected_folder_path)
-            total_skipped_items = skipped
-            end_time = time.time()
-            formatted_size = format_size(size_bytes)
-            status.update(f"[bold green]Calculation complete for '{folder_name}'[/]")
+        start_time = time.time()
+        tree, index = load_size_tree(selected_folder_path, description=f"Calculating size for '{folder_name}'",
+                                     max_age=RENAME_TREE_MAX_AGE)
+        total_skipped_items = tree.skipped_totals[index]
+        end_time = time.time()
+        formatted_size = format_size(tree.sizes[index])
 
         console.print(f"Calculation finished in {end_time - start_time:.2f} seconds.")
         console.print(f"\nFolder: '[bold cyan]{folder_name}[/]'")
         console.print(f"Size:    [bold green]{formatted_size}[/]")
         if total_skipped_items > 0:
              console.print(f"[yellow]Note:[/yellow]   {total_skipped_items} item(s) inside could not be accessed.")
+        print_top_entries(tree, index)
 
         new_folder_name = f"{folder_name} [{formatted_size}]"
         new_full_path = parent_dir / new_folder_name
 
         if len(str(new_full_path)) > 240:
             console.print("\n[yellow]Resulting path would be too long. Cannot propose rename.[/]")
-            return
+            return True
 
         if new_full_path.exists():
             console.print(f"\n[yellow]Cannot rename:[/yellow] A file or folder named '[cyan]{new_folder_name}[/]' already exists in the parent directory.")
-            return
+            return True
 
         console.print(f"\n[yellow]Proposed rename:[/yellow] '[cyan]{folder_name}[/]' -> '[bold green]{new_folder_name}[/]'")
 
-        root_confirm = tk.Tk(); root_confirm.withdraw(); root_confirm.attributes('-topmost', True)
-        confirm = messagebox.askyesno(
+        confirm = confirm_action(
             "Confirm Rename",
             f"Do you want to rename this folder?\n\n"
             f"From: '{folder_name}'\n"
             f"To:   '{new_folder_name}'\n\n"
             f"In directory: {parent_dir}",
-            icon='question' )
-        root_confirm.destroy()
+            icon='question', gui=gui, assume_yes=assume_yes)
 
+        if confirm is None:
+            return False
         if not confirm:
             console.print("[yellow]Rename cancelled by user.[/]")
-            return
+            return True
 
         console.print("\nAttempting to rename...")
         try:
-            selected_folder_path.rename(new_full_path)
-            console.print(f"   -> [green]Successfully renamed to '[bold green]{new_folder_name}[/]'[/]")
+            journal = RenameJournal.create(parent_dir, [(folder_name, new_folder_name)])
         except OSError as e:
-            console.print(f"   -> [bold red]Error renaming folder:[/bold red] {e}")
-        except Exception as e:
-            console.print(f"   -> [bold red]An unexpected error occurred during rename:[/bold red] {e}")
+            console.print(f"   -> [bold red]Error:[/bold red] Cannot write the rename journal, nothing was renamed: {e}")
+            return False
+        try:
+            succeeded, _ = execute_renames(journal, [(folder_name, new_folder_name)])
+            journal.finish()
+        finally:
+            journal.close()
+        return succeeded == 1
 
 
     except PermissionError:
         console.print(f"\n[bold red]Error:[/bold red] Permission denied to access the folder: [cyan]{selected_folder_path}[/]")
     except Exception as e:
         console.print(f"\n[bold red]An unexpected error occurred during analysis:[/bold red] {e}")
+    return False
+
+
+BROWSE_PAGE_SIZE = 25
+BROWSE_SORT_ORDERS = {"s": "size", "c": "count", "n": "name"}
+BROWSE_HELP = (
+    "[bold]NUMBER[/] open folder   [bold]..[/] up   [bold]s[/]/[bold]c[/]/[bold]n[/] sort by size/count/name   "
+    "[bold]/TEXT[/] filter by name ([bold]/[/] clears)   [bold]>[/]/[bold]<[/] next/previous page   [bold]q[/] quit"
+)
+
+def _size_bar(size: int, total: int, width: int = 10) -> str:
+    filled = round(width * size / total) if total else 0
+    return "█" * filled + "░" * (width - filled)
+
+def _print_browse_page(tree: SizeTree, index: int, rows: list[int], page: int, sort_by: str, name_filter: str):
+    total = tree.sizes[index]
+    pages = max(1, -(-len(rows) // BROWSE_PAGE_SIZE))
+    title = f"[cyan]{tree.path_of(index)}[/]  {format_size(total)}, {tree.item_count(index):,} items"
+    details = f"sorted by {sort_by}"
+    if name_filter:
+        details += f", names containing '{name_filter}'"
+    if pages > 1:
+        details += f", page {page + 1}/{pages}"
+    table = ui.Table(title=f"{title} [dim]({details})[/]", show_header=True, header_style="bold magenta", expand=True)
+    table.add_column("#", justify="right", style="bold cyan", no_wrap=True)
+    table.add_column("Folder Name", style="dim cyan", no_wrap=False)
+    table.add_column("Size", justify="right", style="green", no_wrap=True)
+    table.add_column("", no_wrap=True)
+    table.add_column("Items", justify="right", no_wrap=True)
+    table.add_column("Status", justify="left", no_wrap=True)
+    start = page * BROWSE_PAGE_SIZE
+    for number, child in enumerate(rows[start:start + BROWSE_PAGE_SIZE], start + 1):
+        skipped = tree.skipped_totals[child]
+        table.add_row(str(number), ui.Text(tree.name(child) + "/", overflow="fold"), format_size(tree.sizes[child]),
+                      _size_bar(tree.sizes[child], total), f"{tree.item_count(child):,}",
+                      f"[yellow]{skipped} item(s) skipped[/]" if skipped else "")
+    if tree.file_counts[index] and not name_filter:
+        table.add_row("", ui.Text(f"({tree.file_counts[index]:,} files in this folder)"), format_size(tree.file_bytes[index]),
+                      _size_bar(tree.file_bytes[index], total), f"{tree.file_counts[index]:,}", "")
+    console.print(table)
+
+def browse_size_tree(tree: SizeTree, index: int = 0):
+    """Interactive drill-down through a finished scan, like ncdu: open
+       subfolders by number, go back up, sort by size, item count or name
+       and filter by name. Everything is read from tree, so moving around
+       is instant at any depth and never touches the disk.
+    """
+    sort_by = "size"
+    name_filter = ""
+    page = 0
+    console.print(f"[dim]{BROWSE_HELP}[/]")
+    view = None
+    while True:
+        if view != (index, sort_by, name_filter, page):
+            view = (index, sort_by, name_filter, page)
+            rows = tree.sorted_children(index, by=sort_by)
+            if name_filter:
+                needle = name_filter.lower()
+                rows = [child for child in rows if needle in tree.name(child).lower()]
+            _print_browse_page(tree, index, rows, page, sort_by, name_filter)
+        try:
+            command = input("browse> ").strip()
+        except EOFError:
+            return
+        if command in ("q", "quit", "exit"):
+            return
+        if command in ("..", "u", "up"):
+            if index == 0:
+                console.print("[yellow]Already at the top of the scan.[/]")
+            else:
+                index, name_filter, page = tree.parents[index], "", 0
+        elif command in BROWSE_SORT_ORDERS:
+            sort_by, page = BROWSE_SORT_ORDERS[command], 0
+        elif command.startswith("/"):
+            name_filter, page = command[1:], 0
+        elif command == ">":
+            page = min(page + 1, max(0, (len(rows) - 1) // BROWSE_PAGE_SIZE))
+        elif command == "<":
+            page = max(page - 1, 0)
+        elif command.isdigit():
+            if 1 <= int(command) <= len(rows):
+                index, name_filter, page = rows[int(command) - 1], "", 0
+            else:
+                console.print(f"[bold red]No folder numbered {command}.[/]")
+        elif command in ("?", "h", "help"):
+            console.print(f"[dim]{BROWSE_HELP}[/]")
+        elif command:
+            console.print(f"[bold red]Unknown command:[/] {command}. Type ? for help.")
+
+def open_size_tree(path_str: str, description: str = "Scanning"):
+    """Returns (tree, node_index) for path_str: a tree file written by
+       SizeTree.save() is mapped without scanning, a directory is scanned
+       (or reused from this session). Prints the problem and returns None
+       if it is neither.
+    """
+    target_path = Path(path_str).resolve()
+    if target_path.is_file():
+        try:
+            return SizeTree.load(target_path), 0
+        except (OSError, ValueError) as e:
+            console.print(f"[bold red]Error:[/bold red] Cannot open saved tree [cyan]{target_path}[/]: {e}")
+            return None
+    if target_path.is_dir():
+        return load_size_tree(target_path, description=description)
+    console.print(f"[bold red]Error:[/bold red] Not a directory or saved tree: [cyan]{target_path}[/]")
+    return None
+
+def browse_folder(target_directory_str: str | None = None) -> bool:
+    """Action 4: Browse the sizes inside a directory interactively.
+       Prompts for the directory with a dialog unless one is given. The
+       path may also be a tree file written by SizeTree.save(), which is
+       browsed without scanning anything. Returns False on errors.
+    """
+    console.print(ui.Rule("[bold cyan]Browse Folder Sizes[/]"))
+    if target_directory_str is None:
+        target_directory_str = select_directory(title="Select Folder to Browse")
 
+    if not target_directory_str:
+        console.print("[yellow]No directory selected. Returning to menu.[/]")
+        return False
+
+    opened = open_size_tree(target_directory_str)
+    if opened is None:
+        return False
+    browse_size_tree(*opened)
+    return True
+
+SNAPSHOT_SUFFIX = ".dsz"
+DEFAULT_DIFF_LIMIT = 20
+DEFAULT_DIFF_MIN_SIZE = 1024 * 1024
+
+def snapshot_folder(target_directory_str: str, output: Path | None = None) -> bool:
+    """Scans a directory and saves the complete size tree as a snapshot file
+       for later browsing or diffing. Without output, the snapshot is
+       written to the current directory as NAME-YYYYMMDD-HHMMSS.dsz.
+       Returns False on errors.
+    """
+    console.print(ui.Rule("[bold cyan]Save Size Snapshot[/]"))
+    target_directory = Path(target_directory_str).resolve()
+    if not target_directory.is_dir():
+        console.print(f"[bold red]Error:[/bold red] Selected path is not a valid directory: [cyan]{target_directory}[/]")
+        return False
+
+    tree, _ = load_size_tree(target_directory, description="Scanning", reuse=False)
+    if output is None:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(tree.scanned_at))
+        output = Path(f"{target_directory.name or 'root'}-{stamp}{SNAPSHOT_SUFFIX}")
+    try:
+        tree.save(output)
+    except OSError as e:
+        console.print(f"[bold red]Error:[/bold red] Cannot write snapshot [cyan]{output}[/]: {e}")
+        return False
+    console.print(f"Snapshot of [cyan]{target_directory}[/] saved to [cyan]{output}[/]: "
+                  f"{len(tree):,} directories, {format_size(tree.sizes[0])}.")
+    return True
+
+def _format_change(old_size: int, new_size: int) -> str:
+    sign = "+" if new_size >= old_size else "-"
+    return f"{sign}{format_size(abs(new_size - old_size))}"
+
+def print_tree_diff(diff: TreeDiff):
+    """Prints the growth rankings and the new and deleted subtrees of a diff."""
+    old_total = diff.old.sizes[diff.old_start]
+    new_total = diff.new.sizes[diff.new_start]
+    for label, tree, start in (("Before", diff.old, diff.old_start), ("After", diff.new, diff.new_start)):
+        scanned_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(tree.scanned_at))
+        console.print(f"{label + ':':<8}[cyan]{tree.path_of(start)}[/] scanned {scanned_at}, "
+                      f"{format_size(tree.sizes[start])} ({tree.accounting} sizes)")
+    console.print(f"Total change: [bold]{_format_change(old_total, new_total)}[/] "
+                  f"across {diff.compared:,} directories found in both scans.\n")
+
+    for title, rows, change in (
+            ("Largest Growth", diff.largest_growth(), lambda old, new: _format_change(old, new)),
+            (f"Largest Relative Growth (folders of at least {format_size(diff.min_relative_size)})",
+             diff.largest_relative_growth(), lambda old, new: f"+{(new - old) / old:.0%}")):
+        if not rows:
+            continue
+        table = ui.Table(title=title, show_header=True, header_style="bold magenta", expand=True)
+        table.add_column("Path", style="dim cyan", no_wrap=False)
+        table.add_column("Before", justify="right", no_wrap=True)
+        table.add_column("After", justify="right", style="green", no_wrap=True)
+        table.add_column("Change", justify="right", style="bold yellow", no_wrap=True)
+        for old_size, new_size, path in rows:
+            table.add_row(ui.Text(path, overflow="fold"), format_size(old_size), format_size(new_size), change(old_size, new_size))
+        console.print(table)
+    if not diff.largest_growth():
+        console.print("[grey50]No directory grew.[/]")
+
+    for title, count, rows in (("New Subtrees", diff.added_count, diff.new_subtrees()),
+                               ("Deleted Subtrees", diff.removed_count, diff.deleted_subtrees())):
+        if not rows:
+            continue
+        shown = f", largest {len(rows)} shown" if count > len(rows) else ""
+        table = ui.Table(title=f"{title} ({count:,}{shown})", show_header=True, header_style="bold magenta", expand=True)
+        table.add_column("Path", style="dim cyan", no_wrap=False)
+        table.add_column("Size", justify="right", style="green", no_wrap=True)
+        for size, path in rows:
+            table.add_row(ui.Text(path, overflow="fold"), format_size(size))
+        console.print(table)
+
+def diff_snapshots(old_path_str: str, new_path_str: str, limit: int = DEFAULT_DIFF_LIMIT,
+                   min_relative_size: int = DEFAULT_DIFF_MIN_SIZE) -> bool:
+    """Reports what grew between two scans. Each side is a snapshot file or
+       a directory, which is scanned now, so 'diff yesterday.dsz /data'
+       compares a saved scan with the current state. Returns False on errors.
+    """
+    console.print(ui.Rule("[bold cyan]Compare Size Snapshots[/]"))
+    old = open_size_tree(old_path_str)
+    if old is None:
+        return False
+    new = open_size_tree(new_path_str)
+    if new is None:
+        return False
+    (old_tree, old_index), (new_tree, new_index) = old, new
+    if old_tree.path_of(old_index) != new_tree.path_of(new_index):
+        console.print(f"[[bold yellow]Warning[/]]: Comparing different directories, "
+                      f"[cyan]{old_tree.path_of(old_index)}[/] and [cyan]{new_tree.path_of(new_index)}[/].")
+    if old_tree.accounting != new_tree.accounting:
+        console.print(f"[[bold yellow]Warning[/]]: The scans used different size accounting "
+                      f"({old_tree.accounting} and {new_tree.accounting}).")
+    diff = diff_size_trees(old_tree, new_tree, old_index, new_index, limit, min_relative_size)
+    print_tree_diff(diff)
+    return True
 
 def display_menu():
     """Prints the main menu options using Rich Panel."""
@@ -450,16 +3237,286 @@ def display_menu():
         "[bold cyan]1.[/] List Sizes of Subfolders in a Directory\n"
         "[bold cyan]2.[/] Rename Multiple Subfolders with Size ([bold yellow]Use Caution![/])\n"
         "[bold cyan]3.[/] Analyze & Rename a Single Selected Folder\n"
-        "[bold red]4.[/] Exit"
+        "[bold cyan]4.[/] Browse Folder Sizes Interactively\n"
+        "[bold red]5.[/] Exit"
     )
-    console.print(Panel(menu_text, title="[bold magenta]Folder Size Utility Menu[/]", border_style="blue", expand=False))
+    console.print(ui.Panel(menu_text, title="[bold magenta]Folder Size Utility Menu[/]", border_style="blue", expand=False))
+
+
+def _add_scan_options(parser, suppress_defaults=False):
+    """Adds the scan options shared by the menu and every subcommand.
+       Subcommands suppress their defaults so options given before the
+       subcommand name are not overwritten.
+    """
+    import argparse
+
+    def default(value):
+        return argparse.SUPPRESS if suppress_defaults else value
+
+    parser.add_argument("--plain", action="store_true", default=default(False),
+                        help="plain text output without colours, tables or progress bars (does not load rich)")
+    parser.add_argument("--accounting", choices=ACCOUNTING_MODES, default=default("apparent"),
+                        help="apparent: file lengths (default); allocated: disk blocks in use, so sparse files count "
+                             "for less; unique: allocated blocks with each hard-linked file counted once, like du")
+    parser.add_argument("--top", type=int, default=default(0), metavar="N",
+                        help="also report the N largest files and directories at any depth (default: off)")
+    parser.add_argument("-w", "--workers", type=int, default=default(DEFAULT_SCAN_WORKERS),
+                        help=f"number of threads used to list directories (default: {DEFAULT_SCAN_WORKERS}, the serial walk, "
+                             f"which is fastest on local disks; try {NETWORK_SCAN_WORKERS} on network shares)")
+    parser.add_argument("--backend", choices=("auto",) + tuple(SCAN_BACKENDS), default=default("auto"),
+                        help="how directories are read: scandir (portable) or dirfd (open each directory once and "
+                             "stat its files relative to it); auto picks dirfd where supported (default: auto)")
+    parser.add_argument("--async", dest="use_async", action="store_true", default=default(False),
+                        help="schedule directory listings from an asyncio event loop, for network shares (SMB/NFS) "
+                             "where every listing is a round trip; --workers is then not used")
+    parser.add_argument("--max-in-flight", type=int, default=default(DEFAULT_MAX_IN_FLIGHT), metavar="N",
+                        help=f"with --async: directory listings running at once (default: {DEFAULT_MAX_IN_FLIGHT})")
+    parser.add_argument("--max-per-mount", type=int, default=default(DEFAULT_MAX_PER_MOUNT), metavar="N",
+                        help=f"with --async: listings running at once on any one mount point (default: {DEFAULT_MAX_PER_MOUNT})")
+    parser.add_argument("--timeout", type=float, default=default(None), metavar="SECONDS",
+                        help="with --async: give up on a directory whose listing takes longer than this and count it "
+                             "as skipped, without walking its subtree (default: wait indefinitely)")
+    parser.add_argument("--exclude", action="append", default=default([]), metavar="GLOB",
+                        help="skip files and folders matching GLOB; without a '/' it matches names (e.g. .git, "
+                             "node_modules, '*.tmp'), with one the path inside the scanned folder. Repeatable")
+    parser.add_argument("--exclude-regex", action="append", default=default([]), metavar="REGEX",
+                        help="skip files and folders whose path inside the scanned folder matches REGEX. Repeatable")
+    parser.add_argument("--include", action="append", default=default([]), metavar="GLOB",
+                        help="count only files matching GLOB (folders are still scanned). Repeatable")
+    parser.add_argument("--include-regex", action="append", default=default([]), metavar="REGEX",
+                        help="count only files whose path inside the scanned folder matches REGEX. Repeatable")
+    parser.add_argument("-x", "--one-file-system", action="store_true", default=default(False),
+                        help="do not descend into folders on other file systems (mount points)")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--cache", action="store_true", default=default(False),
+                             help="reuse listings of directories whose modification time is unchanged from the "
+                                  "persistent size cache. Faster rescans, but files that grew in place are not "
+                                  "noticed, since that does not change their directory's time")
+    cache_group.add_argument("--rebuild-cache", action="store_true", default=default(False),
+                             help="like --cache, but discard the cache first and rebuild it during this run")
+    cache_group.add_argument("--no-cache", action="store_true", default=default(False),
+                             help="do not read or write the persistent size cache (the default)")
+    parser.add_argument("--cache-file", type=Path, default=default(None),
+                        help=f"location of the size cache (default: {SizeCache.default_path()})")
+    parser.add_argument("--cache-max-entries", type=int, default=default(DEFAULT_CACHE_MAX_ENTRIES),
+                        help=f"directories kept in the cache before the least recently used are evicted (default: {DEFAULT_CACHE_MAX_ENTRIES:,})")
+
+
+def parse_args(argv=None):
+    """Parses command-line options. Without a subcommand the interactive
+       menu is started; list, rename and analyze run headless on the given
+       paths, browse explores one path interactively, snapshot and diff
+       save scans and compare them, and undo and resume act on the journal
+       of an earlier rename run.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calculate folder sizes and optionally rename folders to include them. "
+                                                 "Run without a command for the interactive menu.")
+    _add_scan_options(parser)
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    list_parser = commands.add_parser("list", help="list the sizes of the subfolders of each PATH")
+    list_parser.add_argument("paths", nargs="+", metavar="PATH")
+    list_parser.add_argument("--format", choices=OUTPUT_FORMATS, default="table",
+                             help="table (default) or a machine-readable stream with one record per subfolder, "
+                                  "written as soon as its size is known")
+    list_parser.add_argument("-o", "--output", type=Path, default=None,
+                             help="write jsonl/csv records to this file instead of standard output")
+    list_parser.add_argument("--watch", action="store_true",
+                             help="after the scan, keep the table up to date as files change (inotify, or polling "
+                                  "where it is not available) until Ctrl+C")
+    list_parser.add_argument("--interval", type=float, default=WATCH_REFRESH_SECONDS, metavar="SECONDS",
+                             help=f"with --watch: redraw the table at most this often (default: {WATCH_REFRESH_SECONDS:g})")
+    _add_scan_options(list_parser, suppress_defaults=True)
+
+    rename_parser = commands.add_parser("rename", help="rename the subfolders of each PATH to include their size")
+    rename_parser.add_argument("paths", nargs="+", metavar="PATH")
+    rename_parser.add_argument("-y", "--yes", action="store_true", help="rename without asking for confirmation")
+    _add_scan_options(rename_parser, suppress_defaults=True)
+
+    analyze_parser = commands.add_parser("analyze", help="calculate the size of each PATH and rename it to include the size")
+    analyze_parser.add_argument("paths", nargs="+", metavar="PATH")
+    analyze_parser.add_argument("-y", "--yes", action="store_true", help="rename without asking for confirmation")
+    _add_scan_options(analyze_parser, suppress_defaults=True)
+
+    browse_parser = commands.add_parser("browse", help="scan PATH once and explore the sizes inside it interactively, "
+                                                       "or open a saved tree file")
+    browse_parser.add_argument("path", metavar="PATH")
+    _add_scan_options(browse_parser, suppress_defaults=True)
+
+    for name, help_text in (("undo", "revert the renames of a rename run, newest first"),
+                            ("resume", "finish a rename run that was interrupted")):
+        journal_parser = commands.add_parser(name, help=f"{help_text} (default: the most recent run)")
+        journal_parser.add_argument("journal", nargs="?", metavar="JOURNAL",
+                                    help=f"journal file of the run (kept in {RenameJournal.default_dir()})")
+        journal_parser.add_argument("-y", "--yes", action="store_true", help="do not ask for confirmation")
+        _add_scan_options(journal_parser, suppress_defaults=True)
+
+    snapshot_parser = commands.add_parser("snapshot", help="scan PATH and save its size tree as a snapshot file")
+    snapshot_parser.add_argument("path", metavar="PATH")
+    snapshot_parser.add_argument("-o", "--output", type=Path, default=None,
+                                 help=f"snapshot file to write (default: NAME-YYYYMMDD-HHMMSS{SNAPSHOT_SUFFIX} in the current directory)")
+    _add_scan_options(snapshot_parser, suppress_defaults=True)
+
+    diff_parser = commands.add_parser("diff", help="compare two snapshots (or a snapshot and a directory, scanned now) "
+                                                   "and report what grew")
+    diff_parser.add_argument("old", metavar="OLD")
+    diff_parser.add_argument("new", metavar="NEW")
+    diff_parser.add_argument("--limit", type=int, default=DEFAULT_DIFF_LIMIT, metavar="N",
+                             help=f"directories shown per ranking (default: {DEFAULT_DIFF_LIMIT})")
+    diff_parser.add_argument("--min-size", type=int, default=DEFAULT_DIFF_MIN_SIZE, metavar="BYTES",
+                             help=f"smallest folder ranked by relative growth (default: {DEFAULT_DIFF_MIN_SIZE})")
+    _add_scan_options(diff_parser, suppress_defaults=True)
+
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.top < 0:
+        parser.error("--top must not be negative")
+    if getattr(args, "watch", False):
+        if args.format != "table" or len(args.paths) != 1:
+            parser.error("--watch needs exactly one PATH and the table format")
+        if args.accounting == "unique":
+            parser.error("--watch cannot track hard links; use --accounting apparent or allocated")
+        if args.interval <= 0:
+            parser.error("--interval must be positive")
+    if getattr(args, "limit", 1) < 1:
+        parser.error("--limit must be at least 1")
+    if args.cache_max_entries < 1:
+        parser.error("--cache-max-entries must be at least 1")
+    if args.no_cache + args.cache + args.rebuild_cache > 1:
+        parser.error("--cache, --rebuild-cache and --no-cache cannot be combined")
+    if args.exclude or args.exclude_regex or args.include or args.include_regex or args.one_file_system:
+        try:
+            args.scan_filter = ScanFilter(args.exclude, args.exclude_regex, args.include, args.include_regex,
+                                          args.one_file_system)
+        except re.error as e:
+            parser.error(f"invalid regular expression: {e}")
+    else:
+        args.scan_filter = None
+    return args
+
+
+def run_command(args) -> int:
+    """Runs a headless subcommand over every given path. Returns the exit code."""
+    if args.command == "list" and args.format != "table":
+        return run_streaming_list(args)
+    if args.command == "list" and args.watch:
+        return 0 if watch_folder_sizes(args.paths[0], args.interval) else 1
+    if args.command == "browse":
+        return 0 if browse_folder(args.path) else 1
+    if args.command == "undo":
+        return 0 if undo_renames(args.journal, assume_yes=args.yes) else 1
+    if args.command == "resume":
+        return 0 if resume_renames(args.journal, assume_yes=args.yes) else 1
+    if args.command == "snapshot":
+        return 0 if snapshot_folder(args.path, args.output) else 1
+    if args.command == "diff":
+        return 0 if diff_snapshots(args.old, args.new, args.limit, args.min_size) else 1
+    from collections import Counter
+
+    # How many of the paths still to run lie at or below each directory: a
+    # tree is only kept while a later path can reuse it.
+    resolved = [Path(path).resolve() for path in args.paths]
+    pending_roots = Counter(str(root) for path in resolved for root in (path, *path.parents))
+    ok = True
+    for path, resolved_path in zip(args.paths, resolved):
+        pending_roots.subtract(str(root) for root in (resolved_path, *resolved_path.parents))
+        if args.command == "list":
+            ok = list_folders_with_sizes(path) and ok
+        elif args.command == "rename":
+            ok = rename_folders_with_size(path, assume_yes=args.yes) and ok
+        elif args.command == "analyze":
+            ok = analyze_and_rename_single_folder(path, assume_yes=args.yes) and ok
+        for key in [key for key in session_trees if pending_roots[key] <= 0]:
+            del session_trees[key]
+    return 0 if ok else 1
+
+
+def run_streaming_list(args) -> int:
+    """Runs 'list --format jsonl|csv', writing records for every path to one stream."""
+    stream = sys.stdout
+    if args.output is not None:
+        try:
+            stream = open(args.output, "w", encoding="utf-8", newline="")
+        except OSError as e:
+            console.print(f"[bold red]Error:[/bold red] Cannot write to [cyan]{args.output}[/]: {e}")
+            return 1
+    try:
+        csv_writer = None
+        if args.format == "csv":
+            import csv
+
+            # One header for the whole stream, however many paths are listed.
+            csv_writer = csv.writer(stream)
+            csv_writer.writerow(CSV_FIELDS)
+        ok = True
+        for path in args.paths:
+            ok = stream_folder_sizes(path, stream, csv_writer) and ok
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    return 0 if ok else 1
+
+
+def open_size_cache(args):
+    """Opens the persistent size cache when --cache or --rebuild-cache was
+       given, or returns None when caching is off (the default) or unavailable.
+    """
+    if args.no_cache or not (args.cache or args.rebuild_cache):
+        return None
+    import sqlite3
+
+    cache_path = args.cache_file or SizeCache.default_path()
+    try:
+        cache = SizeCache(cache_path, max_entries=args.cache_max_entries)
+        if args.rebuild_cache:
+            cache.clear()
+    except (OSError, sqlite3.Error) as e:
+        console.print(f"[[bold yellow]Warning[/]]: Size cache disabled, cannot open [cyan]{cache_path}[/]: {e}")
+        return None
+    return cache
+
+
+def main(argv=None) -> int:
+    """Parses command-line options and runs either the requested command or
+       the main menu loop. Returns the process exit code.
+    """
+    args = parse_args(argv)
+    ui.plain = ui.plain or args.plain
+    # Keep standard output clean for records streamed by 'list --format'.
+    ui.stderr = getattr(args, "format", "table") != "table" and args.output is None
+    scan_settings["workers"] = args.workers
+    scan_settings["accounting"] = args.accounting
+    scan_settings["top"] = args.top
+    scan_settings["backend"] = args.backend
+    scan_settings["filter"] = args.scan_filter
+    scan_settings["async"] = args.use_async
+    scan_settings["max_in_flight"] = max(1, args.max_in_flight)
+    scan_settings["max_per_mount"] = max(1, args.max_per_mount)
+    scan_settings["timeout"] = args.timeout if args.timeout and args.timeout > 0 else None
+    if args.accounting != "apparent" and not hasattr(os.stat_result, "st_blocks"):
+        console.print(f"[[bold yellow]Warning[/]]: --accounting {args.accounting} needs st_blocks, which this platform "
+                      "does not provide. Using apparent sizes.")
+        scan_settings["accounting"] = "apparent"
+    scan_settings["cache"] = open_size_cache(args)
+
+    try:
+        if args.command is not None:
+            return run_command(args)
+        run_menu()
+        return 0
+    finally:
+        if scan_settings["cache"] is not None:
+            scan_settings["cache"].close()
 
 
-def main():
-    """Runs the main menu loop."""
+def run_menu():
+    """Runs the interactive menu until the user exits."""
     while True:
         display_menu()
-        choice = input("Enter your choice (1-4): ").strip()
+        choice = input("Enter your choice (1-5): ").strip()
 
         if choice == '1':
             list_folders_with_sizes()
@@ -468,20 +3525,29 @@ def main():
         elif choice == '3':
             analyze_and_rename_single_folder()
         elif choice == '4':
+            browse_folder()
+        elif choice == '5':
             console.print("[bold blue]Exiting program.[/]")
             break
         else:
-            console.print("[bold red]Invalid choice.[/] Please enter 1, 2, 3, or 4.")
+            console.print("[bold red]Invalid choice.[/] Please enter 1, 2, 3, 4, or 5.")
 
         console.print("\n[dim]Press Enter to return to the menu...[/]")
         input()
 
 
 if __name__ == "__main__":
+    exit_code = 1
     try:
-        main()
+        exit_code = main()
     except KeyboardInterrupt:
         console.print("\n[bold yellow]Operation cancelled by user (Ctrl+C). Exiting.[/]")
+        exit_code = 130
+    except BrokenPipeError:
+        # Output was piped into something like 'head' that stopped reading.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        exit_code = 1
     except Exception as e:
         console.print(f"\n[bold red]An critical error occurred:[/]")
         console.print_exception(show_locals=False)
+    sys.exit(exit_code)
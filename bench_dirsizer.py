@@ -0,0 +1,525 @@
+"""Micro-benchmarks for the DirSizer scanner.
+
+scan     builds a synthetic tree in a temporary directory and times the scan
+         implementations and backends against each other, reporting entries
+         per second.
+startup  measures `import DirSizer` with `python -X importtime` and fails
+         when it exceeds the startup budget or pulls in deferred modules.
+suite    builds reproducible synthetic trees (wide, deep, many tiny files,
+         symlink loops, permission-denied folders) and records wall time,
+         entries per second and peak RSS of every scan mode, plus the
+         per-call cost of format_size and check_if_already_renamed, as JSON.
+compare  compares two suite results and fails on regressions.
+
+    python bench_dirsizer.py scan                 # 1M files (slow to build)
+    python bench_dirsizer.py scan --files 100000  # quicker run
+    python bench_dirsizer.py startup --budget-ms 50
+    python bench_dirsizer.py suite -o before.json
+    python bench_dirsizer.py compare before.json after.json --threshold 0.2
+"""
+import os
+import re
+import sys
+import json
+import stat
+import time
+import random
+import shutil
+import timeit
+import platform
+import argparse
+import tempfile
+import py_compile
+import statistics
+import subprocess
+from pathlib import Path
+
+import DirSizer
+
+
+def legacy_get_folder_size(folder_path: Path):
+    """The original recursive, pathlib-based walker, kept as a baseline."""
+    total_size = 0
+    items_skipped = 0
+    try:
+        for entry in os.scandir(folder_path):
+            entry_path = Path(entry.path)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    sub_size, sub_skipped = legacy_get_folder_size(entry_path)
+                    total_size += sub_size
+                    items_skipped += sub_skipped
+                elif entry.is_file(follow_symlinks=False):
+                    try:
+                        total_size += entry_path.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        items_skipped += 1
+            except OSError:
+                items_skipped += 1
+    except OSError:
+        return total_size, items_skipped + 1
+    return total_size, items_skipped
+
+
+def async_folder_size(root: Path):
+    """get_folder_size with the asyncio walker that --async selects."""
+    DirSizer.scan_settings["async"] = True
+    try:
+        return DirSizer.get_folder_size(root)
+    finally:
+        DirSizer.scan_settings["async"] = False
+
+
+def build_tree(root: Path, files: int, files_per_dir: int, fanout: int):
+    """Creates `files` small files spread over a tree with the given fan-out.
+       Returns the number of directory entries created (files + dirs).
+    """
+    dirs_needed = max(1, -(-files // files_per_dir))
+    dirs = [root]
+    queue_index = 0
+    while len(dirs) < dirs_needed:
+        parent = dirs[queue_index]
+        queue_index += 1
+        for i in range(fanout):
+            if len(dirs) >= dirs_needed:
+                break
+            child = parent / f"d{i}"
+            child.mkdir()
+            dirs.append(child)
+
+    created = 0
+    payload = b"x" * 17
+    for dir_path in dirs:
+        for i in range(min(files_per_dir, files - created)):
+            with open(os.path.join(dir_path, f"f{i}"), "wb") as f:
+                f.write(payload)
+            created += 1
+    return created + len(dirs) - 1
+
+
+def time_scan(label, func, root, entries, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(root)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rate = entries / best if best else float("inf")
+    print(f"{label:<24} {best:8.3f} s  {rate:12,.0f} entries/s  result={result}")
+    return result
+
+
+REPO_DIR = Path(__file__).resolve().parent
+
+# Modules that DirSizer must only import on the code paths that need them.
+DEFERRED_MODULES = ("rich", "tkinter", "sqlite3", "concurrent.futures", "argparse", "asyncio", "numpy", "ctypes")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def importtime(args, cwd):
+    """Runs python -X importtime with args and returns {module: cumulative_us}."""
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+    return modules
+
+
+def run_startup(args):
+    py_compile.compile(str(REPO_DIR / "DirSizer.py"), doraise=True)
+    failures = []
+
+    samples = []
+    for _ in range(args.repeat):
+        modules = importtime(["-c", "import DirSizer"], REPO_DIR)
+        samples.append(modules["DirSizer"] / 1000)
+        leaked = sorted(m for m in modules if m.split(".")[0] in DEFERRED_MODULES or m in DEFERRED_MODULES)
+        if leaked:
+            failures.append(f"'import DirSizer' imported deferred modules: {', '.join(leaked)}")
+            break
+    median_ms = statistics.median(samples)
+    print(f"import DirSizer: median {median_ms:.1f} ms over {len(samples)} runs (budget {args.budget_ms:.0f} ms)")
+    if median_ms > args.budget_ms:
+        failures.append(f"import DirSizer took {median_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+
+    with tempfile.TemporaryDirectory(prefix="dirsizer-startup-") as tmp:
+        os.mkdir(os.path.join(tmp, "sub"))
+        modules = importtime([str(REPO_DIR / "DirSizer.py"), "--plain", "--no-cache", "--workers", "1", "list", tmp], REPO_DIR)
+    rich_modules = sorted(m for m in modules if m.split(".")[0] == "rich")
+    if rich_modules:
+        failures.append(f"--plain list imported rich: {', '.join(rich_modules[:5])}")
+    else:
+        print("--plain list: rich not imported")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def run_scan(args):
+    tmp = None
+    if args.dir:
+        root = Path(args.dir)
+        root.mkdir(parents=True, exist_ok=True)
+    else:
+        tmp = tempfile.mkdtemp(prefix="dirsizer-bench-")
+        root = Path(tmp)
+
+    try:
+        if not any(root.iterdir()):
+            print(f"Building {args.files:,} files under {root} ...")
+            start = time.perf_counter()
+            build_tree(root, args.files, args.files_per_dir, args.fanout)
+            print(f"Built in {time.perf_counter() - start:.1f} s")
+        entries = sum(len(d) + len(f) for _, d, f in os.walk(root))
+        print(f"{entries:,} entries\n")
+
+        baseline = time_scan("legacy recursive", legacy_get_folder_size, root, entries, args.repeat)
+        results = [baseline]
+        for backend in DirSizer.SCAN_BACKENDS:
+            DirSizer.scan_settings["backend"] = backend
+            print(f"-- {backend} backend")
+            results.append(time_scan("iterative (1 worker)", lambda p: DirSizer.get_folder_size(p, workers=1), root, entries, args.repeat))
+            results.append(time_scan(f"parallel ({args.workers} workers)", lambda p: DirSizer.get_folder_size(p, workers=args.workers), root, entries, args.repeat))
+            results.append(time_scan(f"asyncio ({DirSizer.DEFAULT_MAX_IN_FLIGHT} in flight)", async_folder_size, root, entries, args.repeat))
+        if any(result != baseline for result in results):
+            print("MISMATCH between implementations", file=sys.stderr)
+            return 1
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+class SyntheticTree:
+    """Builds one of the TREE_SHAPES under root and keeps what a correct
+       scan must report for it: total bytes, items skipped and the number of
+       directory entries. Sizes and layout depend only on the seed.
+    """
+
+    def __init__(self, root: Path, seed: int):
+        self.root = root
+        self.rng = random.Random(seed)
+        self.bytes = 0
+        self.skipped = 0
+        self.entries = 0
+        self.denied = []
+
+    def add_dir(self, path: Path) -> Path:
+        path.mkdir()
+        self.entries += 1
+        return path
+
+    def add_file(self, path: Path, size: int, counted: bool = True):
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        self.entries += 1
+        if counted:
+            self.bytes += size
+
+    def add_files(self, dir_path: Path, count: int, max_size: int, counted: bool = True):
+        for i in range(count):
+            self.add_file(dir_path / f"f{i}", self.rng.randint(0, max_size), counted)
+
+    def balanced_dirs(self, files: int, files_per_dir: int, fanout: int):
+        """Returns the directories of a breadth-first tree holding `files` files."""
+        dirs = [self.root]
+        next_parent = 0
+        while len(dirs) * files_per_dir < files:
+            parent = dirs[next_parent]
+            next_parent += 1
+            for i in range(fanout):
+                dirs.append(self.add_dir(parent / f"d{i}"))
+        return dirs
+
+    def build(self, shape: str, files: int):
+        getattr(self, f"_build_{shape}")(files)
+        return self
+
+    def _build_wide(self, files):
+        # Half the files directly in the root, the rest one per sibling folder.
+        self.add_files(self.root, files // 2, 4096)
+        for i in range(files - files // 2):
+            self.add_files(self.add_dir(self.root / f"d{i}"), 1, 4096)
+
+    def _build_deep(self, files, chains=4, files_per_level=2, max_levels=200):
+        # Chains stop at max_levels so paths stay far below PATH_MAX and the
+        # recursive legacy walker and rmtree stay within the recursion limit;
+        # larger trees get more chains instead.
+        chains = max(chains, -(-files // (max_levels * files_per_level)))
+        levels = max(1, files // (chains * files_per_level))
+        for chain in range(chains):
+            path = self.add_dir(self.root / f"chain{chain}")
+            for level in range(levels):
+                self.add_files(path, files_per_level, 4096)
+                if level + 1 < levels:
+                    path = self.add_dir(path / "d")
+
+    def _build_tiny(self, files, files_per_dir=100):
+        dirs = self.balanced_dirs(files, files_per_dir, 10)
+        remaining = files
+        for dir_path in dirs:
+            count = min(files_per_dir, remaining)
+            self.add_files(dir_path, count, 64)
+            remaining -= count
+
+    def _build_symlinks(self, files, files_per_dir=50):
+        # Every folder links back to the root and to itself, and to a file:
+        # a walker that followed links would never finish or double-count.
+        dirs = self.balanced_dirs(files, files_per_dir, 10)
+        remaining = files
+        for dir_path in dirs:
+            count = min(files_per_dir, remaining)
+            self.add_files(dir_path, count, 4096)
+            remaining -= count
+            for name, target in (("to_root", self.root), ("to_self", dir_path), ("to_file", dir_path / "f0")):
+                os.symlink(target, dir_path / name)
+                self.entries += 1
+
+    def _build_denied(self, files, files_per_dir=50, denied_every=7):
+        dirs = self.balanced_dirs(files, files_per_dir, 10)
+        remaining = files
+        denied = set(dirs[denied_every::denied_every])
+        for dir_path in dirs:
+            count = min(files_per_dir, remaining)
+            inside_denied = any(parent in denied for parent in (dir_path, *dir_path.parents))
+            self.add_files(dir_path, count, 4096, counted=not inside_denied)
+            remaining -= count
+        for dir_path in sorted(denied, key=lambda p: len(p.parts), reverse=True):
+            os.chmod(dir_path, 0)
+            self.denied.append(dir_path)
+        if self.denied and _can_list(self.denied[0]):
+            # Running as root (or on a file system that ignores modes): the
+            # folders are readable after all, so everything counts.
+            self.bytes = sum(os.lstat(os.path.join(d, f)).st_size for d, _, fs in os.walk(self.root) for f in fs)
+        else:
+            # Each unreadable folder costs one skipped item; nested ones are
+            # never reached.
+            self.skipped = sum(1 for d in self.denied if not any(p in denied for p in d.parents))
+
+    def cleanup(self):
+        for dir_path in reversed(self.denied):
+            os.chmod(dir_path, stat.S_IRWXU)
+
+
+TREE_SHAPES = ("wide", "deep", "tiny", "symlinks", "denied")
+
+
+def _can_list(path):
+    try:
+        os.listdir(path)
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def scan_modes(workers):
+    """Yields (mode, backend, function) for every scan configuration."""
+    yield "legacy", None, legacy_get_folder_size
+    for backend in DirSizer.SCAN_BACKENDS:
+        yield "serial", backend, lambda p: DirSizer.get_folder_size(p, workers=1)
+        yield "parallel", backend, lambda p: DirSizer.get_folder_size(p, workers=workers)
+        yield "async", backend, async_folder_size
+
+
+def run_measure(args):
+    """Times one scan configuration in a fresh process, so that peak RSS
+       belongs to that configuration alone, and prints the result as JSON.
+    """
+    for mode, backend, func in scan_modes(args.workers):
+        if mode == args.mode and backend == args.backend:
+            break
+    else:
+        raise SystemExit(f"unknown scan mode {args.mode}/{args.backend}")
+    if backend:
+        DirSizer.scan_settings["backend"] = backend
+    root = Path(args.root)
+    rss_before = _peak_rss_bytes()
+    best = None
+    result = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = func(root)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(json.dumps({"wall_s": best, "result": list(result),
+                      "rss_before_bytes": rss_before, "peak_rss_bytes": _peak_rss_bytes()}))
+    return 0
+
+
+def measure_scan(root, mode, backend, args):
+    command = [sys.executable, str(Path(__file__).resolve()), "_measure", str(root), "--mode", mode,
+               "--repeat", str(args.repeat), "--workers", str(args.workers)]
+    if backend:
+        command += ["--backend", backend]
+    proc = subprocess.run(command, cwd=REPO_DIR, stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def bench_formatters(seed, calls, repeat):
+    """Per-call cost of the helpers that run once per listed folder."""
+    rng = random.Random(seed)
+    sizes = [0] + [int(2 ** rng.uniform(0, 60)) for _ in range(999)]
+    units = ("B", "KB", "MB", "GB", "TB")
+    names = [f"folder {i}" + (f" [{rng.randint(1, 1023)}.{rng.randint(0, 99)} {rng.choice(units)}]" if i % 2 else "")
+             for i in range(1000)]
+    cases = (("format_size", DirSizer.format_size, sizes),
+             ("check_if_already_renamed", DirSizer.check_if_already_renamed, names))
+    results = []
+    for name, func, inputs in cases:
+        loops = max(1, calls // len(inputs))
+        best = min(timeit.repeat(lambda: [func(value) for value in inputs], number=loops, repeat=repeat))
+        total_calls = loops * len(inputs)
+        results.append({"name": name, "calls": total_calls, "ns_per_call": best / total_calls * 1e9})
+    return results
+
+
+def run_suite(args):
+    report = {
+        "version": 1,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "files": args.files,
+        "scans": [],
+        "micro": [],
+    }
+    failures = 0
+    for shape in args.trees:
+        with tempfile.TemporaryDirectory(prefix=f"dirsizer-{shape}-") as tmp:
+            tree = SyntheticTree(Path(tmp), args.seed)
+            try:
+                tree.build(shape, args.files)
+                expected = [tree.bytes, tree.skipped]
+                print(f"-- {shape}: {tree.entries:,} entries, {tree.bytes:,} bytes, {tree.skipped} unreadable",
+                      file=sys.stderr)
+                for mode, backend, _ in scan_modes(args.workers):
+                    measured = measure_scan(tree.root, mode, backend, args)
+                    ok = measured["result"] == expected
+                    failures += not ok
+                    wall = measured["wall_s"]
+                    report["scans"].append({
+                        "tree": shape, "mode": mode, "backend": backend, "entries": tree.entries,
+                        "wall_s": wall, "entries_per_s": tree.entries / wall if wall else None,
+                        "peak_rss_bytes": measured["peak_rss_bytes"], "rss_before_bytes": measured["rss_before_bytes"],
+                        "result": measured["result"], "expected": expected, "ok": ok,
+                    })
+                    rss = DirSizer.format_size(measured["peak_rss_bytes"]) if measured["peak_rss_bytes"] else "?"
+                    mismatch = "" if ok else f"  MISMATCH {measured['result']} != {expected}"
+                    print(f"   {mode:<8} {backend or '-':<8} {wall:8.3f} s  {tree.entries / wall:12,.0f} entries/s"
+                          f"  peak RSS {rss:>9}{mismatch}", file=sys.stderr)
+            finally:
+                tree.cleanup()
+
+    report["micro"] = bench_formatters(args.seed, args.calls, args.repeat)
+    for entry in report["micro"]:
+        print(f"-- {entry['name']}: {entry['ns_per_call']:,.0f} ns/call", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output and args.output != "-":
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if failures:
+        print(f"FAIL: {failures} scan(s) returned wrong totals", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def run_compare(args):
+    """Flags scans and helpers that got slower or bigger by more than the
+       threshold, and scans whose totals became wrong.
+    """
+    old, new = (json.loads(Path(path).read_text(encoding="utf-8")) for path in (args.old, args.new))
+    old_scans = {(s["tree"], s["mode"], s["backend"]): s for s in old["scans"]}
+    regressions = []
+
+    def check(label, metric, before, after):
+        if before and after and after > before * (1 + args.threshold):
+            regressions.append(f"{label}: {metric} {before:.4g} -> {after:.4g} (+{after / before - 1:.0%})")
+
+    for scan in new["scans"]:
+        key = (scan["tree"], scan["mode"], scan["backend"])
+        label = "/".join(part for part in key if part)
+        if not scan["ok"]:
+            regressions.append(f"{label}: result {scan['result']} != expected {scan['expected']}")
+        if key in old_scans:
+            check(label, "wall_s", old_scans[key]["wall_s"], scan["wall_s"])
+            check(label, "peak_rss_bytes", old_scans[key]["peak_rss_bytes"], scan["peak_rss_bytes"])
+    old_micro = {m["name"]: m for m in old["micro"]}
+    for micro in new["micro"]:
+        if micro["name"] in old_micro:
+            check(micro["name"], "ns_per_call", old_micro[micro["name"]]["ns_per_call"], micro["ns_per_call"])
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions over {args.threshold:.0%} in {len(new['scans'])} scans and {len(new['micro'])} helpers.")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True, metavar="{scan,startup,suite,compare}")
+
+    scan = commands.add_parser("scan", help="compare scan implementations on a synthetic tree")
+    scan.add_argument("--files", type=int, default=1_000_000, help="number of files in the synthetic tree")
+    scan.add_argument("--files-per-dir", type=int, default=100)
+    scan.add_argument("--fanout", type=int, default=10, help="subdirectories per directory")
+    scan.add_argument("--repeat", type=int, default=3, help="runs per implementation; the best is reported")
+    scan.add_argument("--workers", type=int, default=DirSizer.NETWORK_SCAN_WORKERS)
+    scan.add_argument("--dir", help="reuse/create the tree here instead of a temporary directory")
+    scan.set_defaults(func=run_scan)
+
+    startup = commands.add_parser("startup", help="check the import-time budget of DirSizer")
+    startup.add_argument("--budget-ms", type=float, default=50.0, help="maximum median cumulative import time of DirSizer")
+    startup.add_argument("--repeat", type=int, default=7)
+    startup.set_defaults(func=run_startup)
+
+    suite = commands.add_parser("suite", help="benchmark every scan mode on synthetic trees and write JSON")
+    suite.add_argument("--files", type=int, default=20_000, help="files per synthetic tree")
+    suite.add_argument("--trees", nargs="+", choices=TREE_SHAPES, default=list(TREE_SHAPES))
+    suite.add_argument("--seed", type=int, default=1, help="seed for file sizes, so runs are comparable")
+    suite.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is reported")
+    suite.add_argument("--workers", type=int, default=DirSizer.NETWORK_SCAN_WORKERS,
+                       help="threads used by the parallel mode")
+    suite.add_argument("--calls", type=int, default=100_000, help="calls per helper micro-benchmark")
+    suite.add_argument("-o", "--output", help="write the JSON report here instead of standard output")
+    suite.set_defaults(func=run_suite)
+
+    compare = commands.add_parser("compare", help="compare two suite reports and fail on regressions")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown or growth")
+    compare.set_defaults(func=run_compare)
+
+    measure = commands.add_parser("_measure")
+    measure.add_argument("root")
+    measure.add_argument("--mode", required=True)
+    measure.add_argument("--backend")
+    measure.add_argument("--repeat", type=int, default=1)
+    measure.add_argument("--workers", type=int, default=DirSizer.NETWORK_SCAN_WORKERS)
+    measure.set_defaults(func=run_measure)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())